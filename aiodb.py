@@ -0,0 +1,176 @@
+"""
+The aiodb module gives asyncio code non-blocking access to the habit database.
+
+Calls run on threads so the event loop never waits on SQLite: writes on a single writer thread, which
+keeps them in order and away from each other's locks, and reads on a bounded pool of reader threads.
+Every thread uses its own connection from the db connection pool. Identical reads that are in flight at
+the same time are coalesced: the query runs once and every caller awaits the same result, so callers
+must not modify the results they get.
+
+    async with AsyncDatabase("main.db") as database:
+        await database.add_habit("running", "daily", "health")
+        streak = await database.get_streak_count("running")
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import analytics
+import db
+from habit import Habit, update_progress_many
+
+
+class AsyncDatabase:
+    """
+    Async access to one database file. An instance belongs to the event loop it is first used on.
+    ':memory:' does not work here, as each thread would get a database of its own.
+    """
+
+    def __init__(self, name="main.db", readers=4, user=""):
+        """
+        :param name: Name of DB to use (default: main.db), e.g. a user's shard from shards.ShardRouter.shard.
+        :param readers: Maximum number of reads running at the same time.
+        :param user: User whose habits to work on (default: '').
+        """
+        self.name = name
+        self.user = user
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="habit-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="habit-reader")
+        self._in_flight = {}
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _connection(self):
+        conn = db.get_connection(self.name, self.user)
+        with self._lock:
+            self._connections.add(db.base_connection(conn))
+        return conn
+
+    def _run(self, function, args, kwargs):
+        return function(self._connection(), *args, **kwargs)
+
+    async def read(self, function, *args):
+        """
+        Function to run a read on a reader thread, sharing the result with identical reads in flight.
+
+        :param function: Function taking a connection followed by args, e.g. db.fetch_habits.
+        :param args: Hashable arguments identifying the read together with function.
+        :return: Result of the function.
+        """
+        key = (function, args)
+        future = self._in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._readers, self._run, function, args, {})
+            self._in_flight[key] = future
+            future.add_done_callback(functools.partial(self._finished, key))
+        # One cancelled caller must not cancel the read for the others.
+        return await asyncio.shield(future)
+
+    def _finished(self, key, future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    async def write(self, function, *args, **kwargs):
+        """
+        Function to run a write on the writer thread.
+        Reads started afterwards are not coalesced with reads started before, so they see the write.
+
+        :param function: Function taking a connection followed by args and kwargs, e.g. db.update_log.
+        :return: Result of the function.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._writer, self._run, function, args, kwargs)
+        finally:
+            self._in_flight.clear()
+
+    async def close(self):
+        """
+        Function to wait for pending calls and close the connections of the worker threads.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._writer.shutdown, wait=True))
+        await loop.run_in_executor(None, functools.partial(self._readers.shutdown, wait=True))
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    # Writes
+
+    async def add_habit(self, name, periodicity, category, as_of=None):
+        """
+        Function to add a habit, see Habit.add.
+
+        :return: True if the habit was added; False if it already exists.
+        """
+        return await self.write(lambda conn: Habit(name, periodicity, category, database=conn, quiet=True,
+                                                   as_of=as_of).add())
+
+    async def remove_habit(self, name):
+        return await self.write(db.remove_habit, name)
+
+    async def update_log(self, name, is_progressed, streak, progress_time):
+        return await self.write(db.update_log, name, is_progressed, streak, progress_time)
+
+    async def update_logs(self, entries):
+        return await self.write(db.update_logs, list(entries))
+
+    async def update_habit_streak(self, name, streak, time=None):
+        return await self.write(db.update_habit_streak, name, streak, time)
+
+    async def update_progress(self, name, as_of=None):
+        """
+        Function to complete a habit, see Habit.update_progress.
+
+        :return: ALREADY_DONE, CONTINUED or MISSED.
+        """
+        return await self.write(lambda conn: Habit(name, database=conn, quiet=True, as_of=as_of).update_progress())
+
+    async def update_progress_many(self, completions):
+        """
+        Function to record many completions in one transaction, see habit.update_progress_many.
+        """
+        completions = list(completions)
+        return await self.write(lambda conn: update_progress_many(completions, conn))
+
+    # Reads
+
+    async def fetch_habits(self, prefix=None, limit=None):
+        return await self.read(db.fetch_habits, prefix, limit)
+
+    async def fetch_categories(self, prefix=None, limit=None):
+        return await self.read(db.fetch_categories, prefix, limit)
+
+    async def habit_exists(self, name):
+        return await self.read(db.habit_exists, name)
+
+    async def get_streak_count(self, name):
+        return await self.read(db.get_streak_count, name)
+
+    async def fetch_habit_state(self, name):
+        return await self.read(db.fetch_habit_state, name)
+
+    async def longest_habit_streak(self, name):
+        return await self.read(analytics.longest_habit_streak, name)
+
+    async def data_of_habits(self, periodicity=None, columns=analytics.HABIT_COLUMNS):
+        return await self.read(analytics.data_of_habits, periodicity, tuple(columns))
+
+    async def data_of_single_habit(self, name):
+        return await self.read(analytics.data_of_single_habit, name)
+
+    async def habit_log(self, name):
+        return await self.read(analytics.habit_log, name)
+
+    async def completions_per_period(self, name, grain="week", start=None, end=None):
+        return await self.read(analytics.completions_per_period, name, grain, start, end)
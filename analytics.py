@@ -3,27 +3,60 @@ The analytics module displays habit streaks and logs
 
 """
 
-from db import connect_database
+from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
 
+import periods
+from db import ROLLUP_GRAINS, TIME_FORMAT, HabitRecord, LogEntry, as_connection, parse_time, rollup_period, user_of
 
-def data_of_habits(db, periodicity) -> list:
+# Timestamps are stored in db.TIME_FORMAT but shown to the user in this format.
+DISPLAY_FORMAT = "%m/%d/%Y %H:%M"
+
+
+def display_time(value):
+    """
+    Function to convert a stored timestamp to the format shown in the CLI.
+
+    :param value: Timestamp in db.TIME_FORMAT.
+    :return: Timestamp in DISPLAY_FORMAT; values in any other format are returned unchanged.
+    """
+    try:
+        return datetime.strptime(value, TIME_FORMAT).strftime(DISPLAY_FORMAT)
+    except (TypeError, ValueError):
+        return value
+
+
+HABIT_COLUMNS = HabitRecord._fields
+
+
+@lru_cache(maxsize=None)
+def _record_type(columns):
+    # Rows with only some of the columns get a record type of their own, made once per set of columns.
+    return HabitRecord if columns == HABIT_COLUMNS else namedtuple("HabitRecord", columns)
+
+
+def data_of_habits(db, periodicity, columns=HABIT_COLUMNS) -> list:
     """
     Function to retrieve list of stored habits with specified periodicity.
 
     :param db: To maintain connection with DB.
-    :param periodicity: Specified periodicity
-    :return: List of stored habits with specified periodicity.
+    :param periodicity: Specified periodicity; "all" or None for every habit.
+    :param columns: habit_tracker columns to return, in order (default: all of them).
+    :return: List of stored habits with specified periodicity, as HabitRecord or, for fewer columns,
+        records with just those fields.
     """
-    
+    columns = tuple(columns)
+    unknown = set(columns) - set(HABIT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    query = f"SELECT {', '.join(columns)} FROM habit_tracker WHERE user = ?"
     cur = db.cursor()
-    if periodicity=="all":
-        cur.execute("SELECT * FROM habit_tracker")
-    else:    
-        query = "SELECT * FROM habit_tracker WHERE periodicity = ?"
-        cur.execute(query, (periodicity,)) 
-    
-    return  cur.fetchall()
-    
+    if periodicity in ("all", None):
+        cur.execute(query, (user_of(db),))
+    else:
+        cur.execute(query + " AND periodicity = ?", (user_of(db), periodicity))
+    return list(map(_record_type(columns)._make, cur))
 
 
 def data_of_single_habit(db, habit_name) -> list:
@@ -32,28 +65,44 @@ def data_of_single_habit(db, habit_name) -> list:
 
     :param db: To maintain connection with DB.
     :param habit_name: Name of habit.
-    :return: Data of specified habit
+    :return: Data of specified habit, as a list of at most one HabitRecord.
     """
     cur = db.cursor()
-    query = "SELECT * FROM habit_tracker WHERE habit = ?"
-    cur.execute(query, (habit_name,))
-    return cur.fetchall()
-    
+    query = f"SELECT {', '.join(HABIT_COLUMNS)} FROM habit_tracker WHERE user = ? AND habit = ?"
+    cur.execute(query, (user_of(db), habit_name))
+    return list(map(HabitRecord._make, cur))
 
 
 def longest_habit_streak(db, habit_name) -> int:
     """
-    Function to get longest habit streak from habit log.
+    Function to get longest habit streak, which is kept up to date on habit_tracker.
 
     :param db: To maintain connection with DB.
     :param habit_name: Name of habit.
-    :return: Longest streak of habit
+    :return: Longest streak of habit; None if habit does not exist.
     """
     cur = db.cursor()
-    query = "SELECT MAX(streak) FROM habit_log WHERE habit = ?"
-    cur.execute(query, (habit_name,))
+    query = "SELECT longest_streak FROM habit_tracker WHERE user = ? AND habit = ?"
+    cur.execute(query, (user_of(db), habit_name))
     data = cur.fetchone()
-    return data[0]
+    return data[0] if data is not None else None
+
+
+def current_streak(record, as_of=None) -> int:
+    """
+    Function to get the streak of a habit as it stands at a time. The stored streak only changes when the
+    habit is completed, so a streak whose habit was not completed in this or the previous period is broken.
+
+    :param record: HabitRecord, or any record with periodicity, streak and completion_time.
+    :param as_of: Reference time (datetime); empty param uses the current time.
+    :return: Stored streak, or 0 if it is broken.
+    """
+    if not record.streak or record.completion_time is None or record.periodicity not in periods.PERIODICITIES:
+        return record.streak
+    as_of = as_of if as_of is not None else datetime.now()
+    if periods.elapsed(parse_time(record.completion_time), as_of, record.periodicity) > 1:
+        return 0
+    return record.streak
 
 
 def habit_log(db, habit_name) -> list:
@@ -62,35 +111,147 @@ def habit_log(db, habit_name) -> list:
 
     :param db: To maintain connection with DB.
     :param habit_name: Name of habit.
-    :return: Log of specified habit.
+    :return: Log of specified habit, as a list of LogEntry.
+    """
+    cur = db.cursor()
+    query = ("SELECT habit, completed, streak, completion_time FROM habit_log WHERE user = ? AND habit = ? "
+             "ORDER BY completion_time, id")
+    cur.execute(query, (user_of(db), habit_name))
+    return list(map(LogEntry._make, cur))
+
+
+def _log_bound(value):
+    # Dates compare as prefixes of stored timestamps, so '2023-12-18' sorts before any time on that day.
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def habit_log_pages(db, habit_name, page_size=50, start=None, end=None):
+    """
+    Generator to page through the log of specified habit in completion order.
+    Each page is fetched with its own keyset query on (completion_time, id), so memory use and
+    the cost of every page stay the same however long the log is.
+
+    :param db: To maintain connection with DB.
+    :param habit_name: Name of habit.
+    :param page_size: Number of log rows per page.
+    :param start: Earliest completion time to include (datetime, date or string in db.TIME_FORMAT).
+    :param end: Completion time to stop before, exclusive (datetime, date or string in db.TIME_FORMAT).
+    :return: Lists of LogEntry.
     """
+    filters, params = ["user = ?", "habit = ?"], [user_of(db), habit_name]
+    if start is not None:
+        filters.append("completion_time >= ?")
+        params.append(_log_bound(start))
+    if end is not None:
+        filters.append("completion_time < ?")
+        params.append(_log_bound(end))
+    query = ("SELECT habit, completed, streak, completion_time, id FROM habit_log WHERE {} "
+             "ORDER BY completion_time, id LIMIT ?")
+    first_page = query.format(" AND ".join(filters))
+    next_page = query.format(" AND ".join(filters + ["(completion_time, id) > (?, ?)"]))
+
     cur = db.cursor()
-    query = "SELECT * FROM habit_log WHERE habit = ?"
-    cur.execute(query, (habit_name,))
+    cur.execute(first_page, params + [page_size])
+    while True:
+        rows = cur.fetchall()
+        if not rows:
+            return
+        yield [LogEntry._make(row[:4]) for row in rows]
+        if len(rows) < page_size:
+            return
+        cur.execute(next_page, params + [rows[-1][3], rows[-1][4], page_size])
+
+
+def iter_habit_log(db, habit_name, page_size=50, start=None, end=None):
+    """
+    Generator to stream the log of specified habit row by row, see habit_log_pages.
+
+    :return: LogEntry records.
+    """
+    for page in habit_log_pages(db, habit_name, page_size, start, end):
+        yield from page
+
+
+def _period_bound(value, grain):
+    # Period names that are not timestamps, such as '2024-01' for a month, are used as they are.
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return rollup_period(value, grain)
+
+
+def completions_per_period(db, habit_name, grain="week", start=None, end=None) -> list:
+    """
+    Function to count completions of specified habit per day, ISO week or month.
+    Counts are read from habit_rollup, so the cost depends on the number of periods, not on the length of the log.
+
+    :param db: To maintain connection with DB.
+    :param habit_name: Name of habit.
+    :param grain: 'day', 'week' or 'month'.
+    :param start: First period to include, by name ('2024-W01') or by a time in it (datetime, date or ISO-8601 string).
+    :param end: Last period to include, inclusive, like start.
+    :return: List of (period, completions) rows, oldest first. Periods without completions are left out.
+    """
+    if grain not in ROLLUP_GRAINS:
+        raise ValueError(f"Unknown grain '{grain}', expected one of {', '.join(ROLLUP_GRAINS)}")
+    filters, params = ["user = ?", "habit = ?", "grain = ?"], [user_of(db), habit_name, grain]
+    if start is not None:
+        filters.append("period >= ?")
+        params.append(_period_bound(start, grain))
+    if end is not None:
+        filters.append("period <= ?")
+        params.append(_period_bound(end, grain))
+    cur = db.cursor()
+    cur.execute(f"SELECT period, completions FROM habit_rollup WHERE {' AND '.join(filters)} ORDER BY period", params)
     return cur.fetchall()
-    
+
+
+def completions_in_period(db, grain="week", period=None) -> list:
+    """
+    Function to count completions of every habit in one day, ISO week or month, read from habit_rollup.
+
+    :param db: To maintain connection with DB.
+    :param grain: 'day', 'week' or 'month'.
+    :param period: Period by name or by a time in it, see completions_per_period. Empty param uses the current one.
+    :return: List of (habit, completions) rows of the habits completed in the period, sorted by habit.
+    """
+    if grain not in ROLLUP_GRAINS:
+        raise ValueError(f"Unknown grain '{grain}', expected one of {', '.join(ROLLUP_GRAINS)}")
+    period = _period_bound(period if period is not None else datetime.now(), grain)
+    cur = db.cursor()
+    cur.execute("SELECT habit, completions FROM habit_rollup WHERE user = ? AND grain = ? AND period = ? ORDER BY habit",
+                (user_of(db), grain, period))
+    return cur.fetchall()
+
 
 
 # Table to show periodicity wise habit's data without streak
-def display_habits_data(periodicity=None):
+def display_habits_data(periodicity=None, database="main.db"):
     """
     Function to show habit data in tabular format.
 
     :param periodicity: To display habits of specified periodicity. Empty param will display all habits.
+    :param database: Name of DB to read from (default: main.db), or an open connection such as a user's one.
     """
-    db = connect_database()
-    data = data_of_habits(db, periodicity)
-    
+    db = as_connection(database)
+    data = data_of_habits(db, periodicity, ("habit", "periodicity", "category", "creation_time"))
+
     if len(data) > 0:
         # Uses string formatting to set columns and rows for the table
         print("\n{:<15} {:<15} {:<15} {:<15}".format("Name", "Periodicity", "Category", "Date/Time"))
         print("-----------------------------------------------------------------")
         for row in data:
             print("{:<15} {:<15} {:<15} {:<15}".format(
-                row[0].capitalize(),  # Name
-                row[1].capitalize(),  # Periodicity
-                row[2].capitalize(),  # Streak
-                row[3].capitalize()))  # Completion TIme
+                row.habit.capitalize(),
+                row.periodicity.capitalize(),
+                row.category.capitalize(),
+                display_time(row.creation_time)))
         print("-----------------------------------------------------------------\n")
 
     else:
@@ -98,15 +259,17 @@ def display_habits_data(periodicity=None):
 
 
 # Table to show habit's streak along with other columns
-def show_habit_streak_data(habit=None):
+def show_habit_streak_data(habit=None, database="main.db"):
     """
     
     Fuction to show streak data of a habit in tabular format.
 
     :param habit: To display streak of specified habit. Empty param will display current streak of all habits.
+    :param database: Name of DB to read from (default: main.db), or an open connection such as a user's one.
     """
 
-    db = connect_database()
+    db = as_connection(database)
+    now = datetime.now()
     if habit is None:
         data = data_of_habits(db, "all")
     else:    
@@ -117,32 +280,63 @@ def show_habit_streak_data(habit=None):
                                                      "Current Streak" if habit is None else "Longest Streak"))
         print(f"{'_' * 70}")  # Print dashes - 70 times to pretty format the table
         for row in data:
-            period = " Day(s)" if row[1] == "daily" else (" Week(s)" if row[1] == "weekly" else " Month(s)")
+            period = {"daily": " Day(s)", "weekly": " Week(s)"}.get(row.periodicity, " Month(s)")
             print("{:<15} {:^15} {:>15} {:^15}".format(
-                row[0].capitalize(),  # Name
-                row[1].capitalize(),  # Periodicity
-                row[5] if row[5] is not None else "--/--/-- --:--",  # Completion Time
-                str(row[4]) + period if habit is None else str(longest_habit_streak(db, habit)) + period))  # Current or Longest Streak
+                row.habit.capitalize(),
+                row.periodicity.capitalize(),
+                display_time(row.completion_time) if row.completion_time is not None else "--/--/-- --:--",
+                str(current_streak(row, now) if habit is None else row.longest_streak) + period))  # Current or Longest
             print(f"{'_' * 70}\n")
     else:
         print("\nLooks empty in here! Please add a habit first.\n")
 
 
 # Displays habits log
-def show_habit_logged_data(name_of_habit):
+def show_habit_logged_data(name_of_habit, page_size=None, more=None, start=None, end=None, database="main.db"):
     """
         Function to show log of specified habit in tabular format.
+        Rows are streamed from DB, so the first ones appear straight away however long the log is.
 
         :param name_of_habit: To display logged data of specified habit.
+        :param page_size: Number of rows per page. Empty param shows the whole log.
+        :param more: Called before showing each further page; paging stops when it returns False.
+        :param start: Earliest completion time to show, see habit_log_pages.
+        :param end: Completion time to stop before, see habit_log_pages.
+        :param database: Name of DB to read from (default: main.db), or an open connection such as a user's one.
         """
-    db = connect_database()
-    data = habit_log(db, name_of_habit)
+    db = as_connection(database)
     print(f"\n{'-' * 75}")  # Print dashes - 75 times to pretty format the table
-    if len(data) > 0:
-        for row in data:
-            print(f"Habit: {row[0].capitalize()} | "
-                  f"Completed : {'True' if row[1] == 1 else 'False'} | "
-                  f"Streak: {row[2]} | Logged at: {row[3]}")
-    else:
+    found = False
+    for page in habit_log_pages(db, name_of_habit, page_size or 500, start, end):
+        if found and page_size and more is not None and not more():
+            break
+        found = True
+        for row in page:
+            print(f"Habit: {row.habit.capitalize()} | "
+                  f"Completed : {'True' if row.completed == 1 else 'False'} | "
+                  f"Streak: {row.streak} | Logged at: {display_time(row.completion_time)}")
+    if not found:
         print("No record found!")
     print(f"{'-' * 75}\n")
+
+
+# Displays completions of a habit per period
+def show_habit_periods(name_of_habit, grain="week", start=None, end=None, database="main.db"):
+    """
+    Function to show the number of completions of specified habit per day, week or month in tabular format.
+
+    :param name_of_habit: To display completions of specified habit.
+    :param grain: 'day', 'week' or 'month'.
+    :param start: First period to show, see completions_per_period.
+    :param end: Last period to show, see completions_per_period.
+    :param database: Name of DB to read from (default: main.db), or an open connection such as a user's one.
+    """
+    data = completions_per_period(as_connection(database), name_of_habit, grain, start, end)
+    if len(data) > 0:
+        print("\n{:<15} {:>15}".format(grain.capitalize(), "Completions"))
+        print(f"{'-' * 31}")
+        for period, completions in data:
+            print("{:<15} {:>15}".format(period, completions))
+        print(f"{'-' * 31}\n")
+    else:
+        print("\nNo record found!\n")
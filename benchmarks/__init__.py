@@ -0,0 +1,3 @@
+"""
+Benchmarks for the habit tracker. Run them from the repository root, e.g. `python -m benchmarks.log_lookup`.
+"""
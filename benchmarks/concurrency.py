@@ -0,0 +1,125 @@
+"""
+Measures throughput with several processes completing habits while others read analytics.
+
+Every writer process completes a habit of its own once a day over consecutive days, one transaction
+per completion; reader processes query the habit list, the streak table and per-period completions
+until the writers are done. Runs report writes and reads per second and any "database is locked" errors.
+
+    python -m benchmarks.concurrency --writers 4 --readers 4 --completions 200
+    python -m benchmarks.concurrency --journal-mode DELETE
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import analytics
+import db
+from benchmarks.synthetic import build_database, habit_names
+from habit import Habit
+
+START = datetime(2021, 1, 1, 8, 0)
+
+
+def writer(path, journal_mode, name, completions, results):
+    """
+    Process to complete a habit on consecutive days.
+    """
+    db.JOURNAL_MODE = journal_mode
+    errors = 0
+    start = time.perf_counter()
+    for day in range(completions):
+        try:
+            Habit(name, database=path, quiet=True, as_of=START + timedelta(days=day)).update_progress()
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(("write", completions, time.perf_counter() - start, errors))
+
+
+def reader(path, journal_mode, names, done, results):
+    """
+    Process to run analytics queries until done is set.
+    """
+    db.JOURNAL_MODE = journal_mode
+    conn = db.get_connection(path)
+    operations = errors = 0
+    start = time.perf_counter()
+    while not done.is_set():
+        try:
+            analytics.data_of_habits(conn, "all")
+            analytics.completions_per_period(conn, names[operations % len(names)], "week")
+            analytics.data_of_single_habit(conn, names[operations % len(names)])
+        except sqlite3.OperationalError:
+            errors += 1
+        operations += 1
+    results.put(("read", operations, time.perf_counter() - start, errors))
+
+
+def run(path, writers=4, readers=4, completions=100, habits=100, journal_mode=db.JOURNAL_MODE):
+    """
+    Function to run writer and reader processes against a fresh database.
+
+    :param path: Path of the DB file to create.
+    :param writers: Number of writer processes, each with a habit of its own.
+    :param readers: Number of reader processes.
+    :param completions: Completions per writer.
+    :param habits: Number of other habits in the database.
+    :param journal_mode: Journal mode, see db.JOURNAL_MODE.
+    :return: Dict with 'write' and 'read' totals of (operations, seconds, errors).
+    """
+    db.JOURNAL_MODE = journal_mode
+    conn = build_database(path, habits, 10)
+    own = [f"writer{i:03d}" for i in range(writers)]
+    with db.transaction(conn):
+        for name in own:
+            db.add_habit(conn, name, "daily", "health", db.format_time(START), 0)
+    conn.close()
+
+    context = multiprocessing.get_context("spawn")
+    results, done = context.Queue(), context.Event()
+    names = habit_names(habits) + own
+    read_processes = [context.Process(target=reader, args=(path, journal_mode, names, done, results))
+                      for _ in range(readers)]
+    write_processes = [context.Process(target=writer, args=(path, journal_mode, name, completions, results))
+                       for name in own]
+    for process in read_processes + write_processes:
+        process.start()
+    totals = {"write": [0, 0.0, 0], "read": [0, 0.0, 0]}
+    for _ in write_processes:
+        kind, operations, seconds, errors = results.get()
+        totals[kind] = [totals[kind][0] + operations, max(totals[kind][1], seconds), totals[kind][2] + errors]
+    done.set()
+    for _ in read_processes:
+        kind, operations, seconds, errors = results.get()
+        totals[kind] = [totals[kind][0] + operations, max(totals[kind][1], seconds), totals[kind][2] + errors]
+    for process in read_processes + write_processes:
+        process.join()
+    return {kind: tuple(values) for kind, values in totals.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--completions", type=int, default=200, help="Completions per writer.")
+    parser.add_argument("--journal-mode", default=db.JOURNAL_MODE, choices=("WAL", "DELETE"))
+    parser.add_argument("--path", default="bench_concurrency.db")
+    args = parser.parse_args(argv)
+
+    try:
+        totals = run(args.path, args.writers, args.readers, args.completions, journal_mode=args.journal_mode)
+    finally:
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+    print(f"journal mode: {args.journal_mode}, {args.writers} writer(s), {args.readers} reader(s)")
+    for kind, (operations, seconds, errors) in totals.items():
+        print(f"{kind + 's':<8} {operations:>8} in {seconds:6.2f} s   {operations / seconds:>10.1f} /s   "
+              f"{errors} locked error(s)")
+
+
+if __name__ == "__main__":
+    main()
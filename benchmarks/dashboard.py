@@ -0,0 +1,53 @@
+"""
+Times the fleet-wide dashboard statistics against a synthetic database.
+
+Loading the log into arrays is timed apart from the statistics computed from them, since the
+dashboard only needs to load once per render.
+
+    python -m benchmarks.dashboard --habits 20000 --depth 100
+"""
+
+import argparse
+import os
+import time
+
+import dashboard
+from benchmarks.synthetic import build_database
+
+
+def timed(function, *args):
+    """
+    Function to call a function once and time it.
+
+    :return: Result of the call and elapsed time in milliseconds.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=20000, help="Number of habits.")
+    parser.add_argument("--depth", type=int, default=100, help="Log rows per habit.")
+    parser.add_argument("--path", default="bench_dashboard.db")
+    args = parser.parse_args(argv)
+
+    conn = build_database(args.path, args.habits, args.depth)
+    try:
+        log, elapsed = timed(dashboard.load, conn)
+        print(f"{'load':<22} {elapsed:>10.1f} ms   ({len(log)} log rows)")
+        total = 0.0
+        for name in ("completion_rates", "streak_stats", "weekday_adherence", "month_adherence",
+                     "rolling_completions"):
+            _, elapsed = timed(getattr(dashboard, name), log)
+            total += elapsed
+            print(f"{name:<22} {elapsed:>10.1f} ms")
+        print(f"{'statistics':<22} {total:>10.1f} ms")
+    finally:
+        conn.close()
+        os.remove(args.path)
+
+
+if __name__ == "__main__":
+    main()
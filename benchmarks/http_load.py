@@ -0,0 +1,133 @@
+"""
+Load-tests the JSON HTTP API of the server module over keep-alive connections.
+
+A server is started on a free local port against a synthetic database. Client threads each send their
+requests over one persistent connection: streak and log reads, revalidated with If-None-Match once an
+ETag is known, and a share of completions of the client's own habits on consecutive days. Runs report
+requests per second and latency percentiles. Clients beyond --workers wait for a free worker thread,
+which the server frees by closing a kept-alive connection; clients then reconnect.
+
+    python -m benchmarks.http_load --clients 8 --requests 2000 --workers 8
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from benchmarks.synthetic import START, build_database, habit_names
+from server import HabitServer
+
+
+def percentile(latencies, fraction):
+    """
+    Function to get a percentile of sorted latencies.
+
+    :param latencies: Latencies in ascending order.
+    :param fraction: Percentile as a fraction, e.g. 0.99.
+    :return: Latency at the percentile.
+    """
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def client(port, readable, writable, requests, write_share, depth, seed, results):
+    """
+    Thread to send requests over one keep-alive connection.
+    """
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etags, latencies, statuses = {}, [], Counter()
+    day = depth
+    for _ in range(requests):
+        if writable and rng.random() < write_share:
+            day += 1
+            method, path = "POST", f"/habits/{rng.choice(writable)}/completions"
+            body, headers = json.dumps({"at": str(START + timedelta(days=day))}), {}
+        else:
+            method, path = "GET", f"/habits/{rng.choice(readable)}/{rng.choice(('streak', 'log'))}"
+            body, headers = None, {"If-None-Match": etags[path]} if path in etags else {}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed the idle connection for a waiting client; the request was not served.
+            conn.close()
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] += 1
+        if response.getheader("ETag"):
+            etags[path] = response.getheader("ETag")
+    conn.close()
+    results.append((latencies, statuses))
+
+
+def run(path, clients=8, requests=500, habits=200, depth=30, workers=8, write_share=0.1):
+    """
+    Function to load-test a server on a fresh database.
+
+    :param path: Path of the DB file to create.
+    :param clients: Number of client threads, each with one connection.
+    :param requests: Requests per client.
+    :param habits: Number of habits in the database.
+    :param depth: Log rows per habit.
+    :param workers: Worker threads of the server.
+    :param write_share: Share of requests that are completions.
+    :return: Dict with requests, seconds, rps, p50 and p99 latency in ms, and a Counter of statuses.
+    """
+    build_database(path, habits, depth).close()
+    httpd = HabitServer(("127.0.0.1", 0), path, workers)
+    serving = threading.Thread(target=httpd.serve_forever, daemon=True)
+    serving.start()
+    names = habit_names(habits)
+    results = []
+    threads = [threading.Thread(target=client, args=(httpd.server_address[1], names, names[number::clients],
+                                                     requests, write_share, depth, number, results))
+               for number in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    httpd.shutdown()
+    httpd.server_close()
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    statuses = sum((client_statuses for _, client_statuses in results), Counter())
+    return {"requests": len(latencies), "seconds": seconds, "rps": len(latencies) / seconds,
+            "p50": percentile(latencies, 0.5) * 1e3, "p99": percentile(latencies, 0.99) * 1e3, "statuses": statuses}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per client.")
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=30, help="Log rows per habit.")
+    parser.add_argument("--workers", type=int, default=8, help="Worker threads of the server.")
+    parser.add_argument("--write-share", type=float, default=0.1, help="Share of requests that are completions.")
+    parser.add_argument("--path", default="bench_http.db")
+    args = parser.parse_args(argv)
+
+    try:
+        stats = run(args.path, args.clients, args.requests, args.habits, args.depth, args.workers, args.write_share)
+    finally:
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+    print(f"{stats['requests']} requests from {args.clients} client(s) to {args.workers} worker(s) "
+          f"in {stats['seconds']:.2f} s")
+    print(f"{stats['rps']:.0f} requests/s   p50 {stats['p50']:.2f} ms   p99 {stats['p99']:.2f} ms")
+    print("statuses: " + ", ".join(f"{status}: {count}" for status, count in sorted(stats["statuses"].items())))
+
+
+if __name__ == "__main__":
+    main()
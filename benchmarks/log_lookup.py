@@ -0,0 +1,57 @@
+"""
+Shows that per-habit habit_log lookups stay flat as the total log grows.
+
+Each round grows the number of habits while keeping the log depth per habit fixed, then times
+the per-habit queries with the (user, habit, completion_time) index and with the index disabled.
+
+    python -m benchmarks.log_lookup --rounds 1000 10000 100000 --depth 30
+"""
+
+import argparse
+import os
+import random
+import time
+
+from benchmarks.synthetic import build_database, habit_names
+
+QUERIES = {
+    "longest_streak": "SELECT MAX(streak) FROM habit_log {hint} WHERE user = '' AND habit = ?",
+    "habit_log": "SELECT habit, completed, streak, completion_time FROM habit_log {hint} WHERE user = '' AND habit = ?",
+}
+
+
+def time_query(conn, query, names):
+    """
+    Function to time a query over a sample of habits.
+
+    :return: Mean time per query in microseconds.
+    """
+    start = time.perf_counter()
+    for name in names:
+        conn.execute(query, (name,)).fetchall()
+    return (time.perf_counter() - start) / len(names) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="Number of habits in each round.")
+    parser.add_argument("--depth", type=int, default=30, help="Log rows per habit.")
+    parser.add_argument("--samples", type=int, default=200, help="Habits queried per round.")
+    parser.add_argument("--path", default="bench_log_lookup.db")
+    args = parser.parse_args(argv)
+
+    print(f"{'log rows':>12} {'query':<16} {'indexed (us)':>14} {'scan (us)':>14}")
+    for habits in args.rounds:
+        conn = build_database(args.path, habits, args.depth)
+        names = random.Random(1).sample(habit_names(habits), min(args.samples, habits))
+        for label, query in QUERIES.items():
+            indexed = time_query(conn, query.format(hint=""), names)
+            scan = time_query(conn, query.format(hint="NOT INDEXED"), names[:10])
+            print(f"{habits * args.depth:>12} {label:<16} {indexed:>14.1f} {scan:>14.1f}")
+        conn.close()
+        os.remove(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Measures statements issued and time spent per Habit.update_progress call.
+
+    python -m benchmarks.progress_update --habits 2000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import db
+from benchmarks.synthetic import build_database, habit_names
+from habit import Habit
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=2000, help="Number of habits to update.")
+    parser.add_argument("--depth", type=int, default=30, help="Log rows per habit.")
+    parser.add_argument("--path", default="bench_progress_update.db")
+    args = parser.parse_args(argv)
+
+    build_database(args.path, args.habits, args.depth).close()
+    statements = []
+    db.get_connection(args.path).set_trace_callback(statements.append)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in habit_names(args.habits):
+            Habit(name, database=args.path).update_progress()
+    elapsed = time.perf_counter() - start
+
+    db.close_connections(args.path)
+    os.remove(args.path)
+    print(f"updates:             {args.habits}")
+    print(f"statements / update: {len(statements) / args.habits:.1f}")
+    print(f"time / update (us):  {elapsed / args.habits * 1e6:.1f}")
+
+
+if __name__ == "__main__":
+    main()
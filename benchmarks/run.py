@@ -0,0 +1,217 @@
+"""
+Benchmark suite for the db, habit and analytics hot paths.
+
+Builds a synthetic database with the requested number of habits and log depth, times each
+benchmark and writes the results as JSON so runs can be compared across releases.
+
+    python -m benchmarks.run --habits 5000 --depth 60 --output bench_results.json
+    python -m benchmarks.run --only db.fetch_habits habit.update_progress
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import analytics
+import db
+from benchmarks.synthetic import build_database, habit_names
+from habit import Habit, progress_outcomes
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Decorator to register a benchmark. The decorated function receives the run's Context and
+    returns the callable to time.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class Context:
+    """
+    State shared by the benchmarks of one run.
+    """
+
+    def __init__(self, path, habits, depth, seed):
+        self.path = path
+        self.habits = habits
+        self.depth = depth
+        self.names = habit_names(habits)
+        self.random = random.Random(seed)
+
+    @property
+    def db(self):
+        return db.get_connection(self.path)
+
+    def sample(self):
+        return self.random.choice(self.names)
+
+
+@benchmark("habit.add")
+def bench_habit_add(ctx):
+    counter = itertools.count()
+    return lambda: Habit(f"added{next(counter):07d}", "daily", "health", database=ctx.path).add()
+
+
+@benchmark("habit.update_progress")
+def bench_habit_update_progress(ctx):
+    return lambda: Habit(ctx.sample(), database=ctx.path).update_progress()
+
+
+@benchmark("habit.progress_outcomes[all]")
+def bench_progress_outcomes(ctx):
+    as_of = datetime(2020, 3, 1, 8, 0)
+    return lambda: progress_outcomes(as_of=as_of, database=ctx.path)
+
+
+@benchmark("db.fetch_habits")
+def bench_fetch_habits(ctx):
+    return lambda: db.fetch_habits(ctx.db)
+
+
+@benchmark("db.fetch_categories")
+def bench_fetch_categories(ctx):
+    return lambda: db.fetch_categories(ctx.db)
+
+
+@benchmark("analytics.longest_habit_streak")
+def bench_longest_habit_streak(ctx):
+    return lambda: analytics.longest_habit_streak(ctx.db, ctx.sample())
+
+
+@benchmark("analytics.completions_per_period")
+def bench_completions_per_period(ctx):
+    return lambda: analytics.completions_per_period(ctx.db, ctx.sample(), "week")
+
+
+@benchmark("analytics.display_habits_data")
+def bench_display_habits_data(ctx):
+    return lambda: analytics.display_habits_data("all", database=ctx.path)
+
+
+@benchmark("analytics.show_habit_streak_data")
+def bench_show_habit_streak_data(ctx):
+    return lambda: analytics.show_habit_streak_data(database=ctx.path)
+
+
+@benchmark("analytics.show_habit_streak_data[habit]")
+def bench_show_single_habit_streak_data(ctx):
+    return lambda: analytics.show_habit_streak_data(ctx.sample(), database=ctx.path)
+
+
+@benchmark("analytics.show_habit_logged_data")
+def bench_show_habit_logged_data(ctx):
+    return lambda: analytics.show_habit_logged_data(ctx.sample(), database=ctx.path)
+
+
+def measure(run, repeat, warmup=1):
+    """
+    Function to time a callable, discarding the output it prints.
+
+    :param run: Callable to time.
+    :param repeat: Number of timed calls.
+    :param warmup: Number of untimed calls made first.
+    :return: Dict of timing statistics in seconds.
+    """
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        for i in range(warmup + repeat):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            if i >= warmup:
+                timings.append(elapsed)
+            # Keep the captured output from growing across thousands of calls.
+            out.seek(0)
+            out.truncate()
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max": timings[-1],
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def run_suite(habits, depth, repeat, only=None, path="bench_suite.db", seed=0):
+    """
+    Function to run the registered benchmarks against a fresh synthetic database.
+
+    :param habits: Number of habits in the database.
+    :param depth: Log rows per habit.
+    :param repeat: Number of timed calls per benchmark.
+    :param only: Names of benchmarks to run. Empty param runs them all.
+    :param path: Path of the temporary DB file.
+    :param seed: Seed for data generation and sampling.
+    :return: Dict with run metadata and per-benchmark results.
+    """
+    unknown = set(only or ()) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    build_database(path, habits, depth, seed).close()
+    ctx = Context(path, habits, depth, seed)
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            results[name] = measure(setup(ctx), repeat)
+    finally:
+        db.close_connections(path)
+        os.remove(path)
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "habits": habits,
+            "depth": depth,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=1000, help="Number of habits in the synthetic database.")
+    parser.add_argument("--depth", type=int, default=30, help="Log rows per habit.")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per benchmark.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", metavar="NAME", help=f"Benchmarks to run: {', '.join(BENCHMARKS)}.")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout.")
+    parser.add_argument("--path", default="bench_suite.db", help="Path of the temporary DB file.")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.habits, args.depth, args.repeat, args.only, args.path, args.seed)
+    for name, stats in report["results"].items():
+        print(f"{name:<42} median {stats['median'] * 1e6:>10.1f} us   p95 {stats['p95'] * 1e6:>10.1f} us",
+              file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
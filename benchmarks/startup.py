@@ -0,0 +1,66 @@
+"""
+Measures import time of the headless modules with `python -X importtime` and checks it against a target.
+
+The UI stack (questionary and prompt_toolkit) must not be imported at all; the run fails if it is,
+or if the median cumulative import time is above the target.
+
+    python -m benchmarks.startup --target-ms 80 --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEADLESS_MODULES = ("db", "habit", "analytics", "streaks", "cli", "main")
+UI_MODULES = ("questionary", "prompt_toolkit")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(modules):
+    """
+    Function to import modules in a fresh interpreter and read its -X importtime report.
+
+    :param modules: Names of modules to import.
+    :return: Dict mapping every imported module to its cumulative import time in microseconds.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=80.0, help="Allowed median import time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args(argv)
+
+    runs = [import_times(HEADLESS_MODULES) for _ in range(args.runs)]
+    totals = [sum(times[module] for module in HEADLESS_MODULES if module in times) / 1000 for times in runs]
+    median = statistics.median(totals)
+    ui_loaded = sorted({name for times in runs for name in times if name.split(".")[0] in UI_MODULES})
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)[:10]
+
+    if args.json:
+        print(json.dumps({"median_ms": median, "runs_ms": totals, "target_ms": args.target_ms,
+                          "ui_modules_imported": ui_loaded}, indent=2))
+    else:
+        print(f"median import time: {median:.1f} ms (target {args.target_ms:.0f} ms, {args.runs} runs)")
+        for name, cumulative in slowest:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        if ui_loaded:
+            print(f"UI modules imported: {', '.join(ui_loaded)}")
+    return 1 if ui_loaded or median > args.target_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Builds synthetic habit databases for the benchmarks.
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+
+import db
+from habit import Habit
+
+PERIODICITIES = ("daily", "weekly", "monthly")
+CATEGORIES = ("health", "growth", "finance", "chores", "fun", "life")
+START = datetime(2020, 1, 1, 8, 0)
+
+
+def habit_names(count):
+    """
+    Function to generate deterministic habit names.
+
+    :param count: Number of names.
+    :return: List of habit names.
+    """
+    return [f"habit{i:07d}" for i in range(count)]
+
+
+def build_database(path, habits, log_depth, seed=0):
+    """
+    Function to create a database with the given number of habits, each holding log_depth log rows.
+    An existing file at path is replaced.
+
+    :param path: Path of DB file to create.
+    :param habits: Number of habits.
+    :param log_depth: Number of log rows per habit.
+    :param seed: Seed for the random generator.
+    :return: DB connection.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = db.connect_database(path)
+    with db.transaction(conn):
+        for name in habit_names(habits):
+            periodicity = rng.choice(PERIODICITIES)
+            created = START.strftime(Habit.DATE_FORMAT)
+            db.add_habit(conn, name, periodicity, rng.choice(CATEGORIES), created, 0)
+            conn.executemany(
+                "INSERT INTO habit_log (habit, completed, streak, completion_time) VALUES (?, ?, ?, ?)",
+                ((name, True, day + 1, (START + timedelta(days=day)).strftime(Habit.DATE_FORMAT))
+                 for day in range(log_depth)))
+    return conn
@@ -0,0 +1,355 @@
+"""
+The cli module runs habit tracker commands without the interactive menu, for scripts and batch jobs.
+Every command that takes habits also reads them as CSV rows from stdin when given a single '-'.
+
+    python main.py add running daily health
+    printf 'running\nreading,2024-01-05 07:30\n' | python main.py complete -
+    python main.py import completions.csv
+    python main.py export logs logs.jsonl
+    python main.py report streaks
+    python main.py --database data --shards 8 --user alice report streaks
+
+Exit status is 0 on success, 1 if any operation failed and 2 on invalid usage.
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+from datetime import datetime
+from itertools import chain, islice
+
+import analytics
+import db
+import shards
+import transfer
+from habit import ALREADY_DONE, CONTINUED, MISSED, Habit, update_progress_many
+
+PERIODICITIES = ("daily", "weekly", "monthly")
+
+# Completions are applied in chunks of this many rows, each chunk in one transaction.
+CHUNK_SIZE = 10000
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def error(message):
+    """
+    Function to report a failed operation on stderr.
+    """
+    print(f"error: {message}", file=sys.stderr)
+
+
+def read_rows(values, stdin, header=None):
+    """
+    Function to get the rows a command works on: CSV rows from stdin when the only value is '-',
+    otherwise one row per value. Blank rows and rows starting with '#' are skipped.
+
+    :param values: Values given on the command line.
+    :param stdin: Stream to read from for '-'.
+    :param header: First column of a header row, e.g. 'habit', skipped if it is the first CSV row.
+    :return: Iterable of rows, each a list of strings.
+    """
+    if values != ["-"]:
+        return ([value] for value in values)
+    rows = (row for row in csv.reader(stdin) if row and not row[0].lstrip().startswith("#"))
+    if header is not None:
+        first = next(rows, None)
+        if first is not None and first[0].strip().lower() != header:
+            rows = chain([first], rows)
+    return rows
+
+
+def parse_time(value):
+    """
+    Function to convert an ISO-8601 timestamp given by the user to the stored format.
+
+    :param value: Timestamp such as '2024-01-05', '2024-01-05 07:30' or '2024-01-05T07:30:00'.
+    :return: Timestamp in Habit.DATE_FORMAT.
+    """
+    return db.local_time(datetime.fromisoformat(value.strip())).strftime(Habit.DATE_FORMAT)
+
+
+def connection(args):
+    """
+    Function to get the connection to the habits of --user: in the --database file, or with --shards in the
+    user's shard in the --database directory.
+    """
+    if args.shards:
+        return shards.ShardRouter.from_directory(args.database, args.shards).connection(args.user)
+    return db.get_connection(args.database, args.user)
+
+
+def command_add(args, stdin):
+    rows = read_rows(args.habits, stdin) if args.habits == ["-"] else [args.habits]
+    conn = connection(args)
+    added = failed = 0
+    with db.transaction(conn):
+        for row in rows:
+            if len(row) != 3 or row[1].strip().lower() not in PERIODICITIES or not row[0].strip():
+                error(f"expected 'name,periodicity,category' with periodicity one of {', '.join(PERIODICITIES)}: "
+                      f"{','.join(row)}")
+                failed += 1
+                continue
+            name, periodicity, category = (value.strip().lower() for value in row)
+            if Habit(name, periodicity, category, database=conn, quiet=True).add():
+                added += 1
+            else:
+                error(f"habit '{name}' already exists")
+                failed += 1
+    print(f"Added {added} habit(s).")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def command_remove(args, stdin):
+    conn = connection(args)
+    removed = failed = 0
+    with db.transaction(conn):
+        for row in read_rows(args.habits, stdin):
+            name = row[0].strip().lower()
+            if not db.habit_exists(conn, name):
+                error(f"habit '{name}' does not exist")
+                failed += 1
+                continue
+            Habit(name, database=conn, quiet=True).remove()
+            removed += 1
+    print(f"Removed {removed} habit(s).")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def apply_completions(rows, database, default_time):
+    """
+    Function to record completions in chunks of CHUNK_SIZE, reporting a summary.
+    Rows should be in chronological order; each chunk is applied in one transaction.
+
+    :param rows: Iterable of [habit] or [habit, timestamp] rows.
+    :param database: Name of DB to update, or an open connection.
+    :param default_time: Completion time for rows without a timestamp.
+    :return: Exit status.
+    """
+    counts = {CONTINUED: 0, MISSED: 0, ALREADY_DONE: 0}
+    failed = 0
+    rows = iter(rows)
+    while True:
+        completions = []
+        for row in islice(rows, CHUNK_SIZE):
+            name = row[0].strip().lower()
+            if not name:
+                error(f"expected 'habit[,timestamp]': {','.join(row)}")
+                failed += 1
+                continue
+            try:
+                completion_time = parse_time(row[1]) if len(row) > 1 and row[1].strip() else default_time
+            except ValueError:
+                error(f"invalid timestamp for habit '{name}': {row[1]}")
+                failed += 1
+                continue
+            completions.append((name, completion_time))
+        if not completions:
+            break
+        for name, completion_time, outcome in update_progress_many(completions, database):
+            if outcome is None:
+                error(f"habit '{name}' does not exist")
+                failed += 1
+            else:
+                counts[outcome] += 1
+    print(f"Completed {counts[CONTINUED]} habit(s), reset {counts[MISSED]} missed streak(s), "
+          f"skipped {counts[ALREADY_DONE]} already completed.")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def command_complete(args, stdin):
+    default_time = parse_time(args.at) if args.at else datetime.now().strftime(Habit.DATE_FORMAT)
+    return apply_completions(read_rows(args.habits, stdin, "habit"), connection(args), default_time)
+
+
+def command_import(args, stdin):
+    fmt = args.format or transfer.format_for(args.file)
+    try:
+        file = stdin if args.file == "-" else open(args.file, newline="")
+    except OSError as exception:
+        error(f"cannot read {args.file}: {exception.strerror}")
+        return EXIT_FAILED
+    try:
+        if args.table == "completions":
+            default_time = datetime.now().strftime(Habit.DATE_FORMAT)
+            if fmt == "jsonl":
+                # Records without a habit become empty rows, which apply_completions reports as failed.
+                rows = ([str(record.get("habit") or ""), str(record.get("timestamp") or "")]
+                        if isinstance(record, dict) else [""] for record in transfer.read_records(file, fmt))
+            else:
+                rows = read_rows(["-"], file, "habit")
+            return apply_completions(rows, connection(args), default_time)
+        try:
+            count = transfer.import_file(connection(args), args.table, file, fmt)
+        except sqlite3.IntegrityError as exception:
+            error(f"import rolled back: {exception}")
+            return EXIT_FAILED
+        print(f"Imported {count} {args.table} row(s).")
+        return EXIT_OK
+    finally:
+        if file is not stdin:
+            file.close()
+
+
+def command_export(args, stdin):
+    fmt = args.format or transfer.format_for(args.file)
+    conn = connection(args)
+    habit = args.habit and args.habit.lower()
+    if args.file == "-":
+        transfer.export_file(conn, args.table, sys.stdout, fmt, habit)
+    else:
+        with open(args.file, "w", newline="") as file:
+            count = transfer.export_file(conn, args.table, file, fmt, habit)
+        print(f"Exported {count} {args.table} row(s).")
+    return EXIT_OK
+
+
+def command_report(args, stdin):
+    conn = connection(args)
+    habit = getattr(args, "habit", None)
+    if habit is not None and not db.habit_exists(conn, habit.lower()):
+        error(f"habit '{habit}' does not exist")
+        return EXIT_FAILED
+    if args.report == "dashboard":
+        try:
+            import dashboard  # needs NumPy, which the other commands do without
+        except ImportError as exception:
+            error(exception)
+            return EXIT_FAILED
+        dashboard.show_dashboard(conn, args.top, args.as_of and parse_time(args.as_of))
+    elif args.report == "periods":
+        analytics.show_habit_periods(habit.lower(), args.grain, args.start, args.end, database=conn)
+    elif args.report == "habits":
+        analytics.display_habits_data(args.periodicity, database=conn)
+    elif args.report == "streaks":
+        analytics.show_habit_streak_data(habit and habit.lower(), database=conn)
+    else:
+        analytics.show_habit_logged_data(habit.lower(), start=args.start and parse_time(args.start),
+                                         end=args.end and parse_time(args.end), database=conn)
+    return EXIT_OK
+
+
+def command_rebuild_rollups(args, stdin):
+    # Rollups are rebuilt for every user, in every shard.
+    paths = shards.ShardRouter.from_directory(args.database, args.shards).paths if args.shards else [args.database]
+    count = sum(db.rebuild_rollups(db.get_connection(path)) for path in paths)
+    print(f"Rebuilt {count} rollup row(s).")
+    return EXIT_OK
+
+
+def command_serve(args, stdin):
+    import server  # only the serve command needs the HTTP modules
+
+    router = shards.ShardRouter.from_directory(args.database, args.shards) if args.shards else None
+    httpd = server.HabitServer((args.host, args.port), args.database, args.workers, router, args.verbose)
+    print(f"Serving habits on http://{args.host}:{httpd.server_address[1]}/ (Ctrl+C to stop).")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+    return EXIT_OK
+
+
+def build_parser():
+    """
+    Function to build the command line parser.
+    """
+    parser = argparse.ArgumentParser(prog="main.py", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="main.db",
+                        help="Database file to use, or with --shards the directory of the shards (default: main.db).")
+    parser.add_argument("--user", default="", help="User whose habits to work on (default: the single-user '').")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Spread users over this many database files in the --database directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Add a habit, or 'name,periodicity,category' rows from stdin with '-'.")
+    add.add_argument("habits", nargs="+", metavar="NAME PERIODICITY CATEGORY")
+    add.set_defaults(run=command_add)
+
+    remove = commands.add_parser("remove", help="Remove habits, or habit names from stdin with '-'.")
+    remove.add_argument("habits", nargs="+", metavar="NAME")
+    remove.set_defaults(run=command_remove)
+
+    complete = commands.add_parser("complete",
+                                   help="Mark habits as completed, or 'name[,timestamp]' rows from stdin with '-'.")
+    complete.add_argument("habits", nargs="+", metavar="NAME")
+    complete.add_argument("--at", help="Completion time (ISO-8601) for habits given without one (default: now).")
+    complete.set_defaults(run=command_complete)
+
+    import_ = commands.add_parser("import", help="Import completions, habits or logs from a CSV or JSON Lines file.")
+    import_.add_argument("file", nargs="?", default="-", help="File to read (default: stdin).")
+    import_.add_argument("--table", choices=("completions",) + tuple(transfer.COLUMNS), default="completions",
+                         help="'completions' applies habit,timestamp rows like 'complete'; 'habits' and 'logs' "
+                              "load rows as they are, in one transaction (default: completions).")
+    import_.add_argument("--format", choices=transfer.FORMATS, help="Input format (default: from file extension, "
+                                                                    "else csv).")
+    import_.set_defaults(run=command_import)
+
+    export = commands.add_parser("export", help="Export habits or logs as CSV or JSON Lines.")
+    export.add_argument("table", choices=tuple(transfer.COLUMNS))
+    export.add_argument("file", nargs="?", default="-", help="File to write (default: stdout).")
+    export.add_argument("--format", choices=transfer.FORMATS, help="Output format (default: from file extension, "
+                                                                   "else csv).")
+    export.add_argument("--habit", help="Only export this habit, or its log.")
+    export.set_defaults(run=command_export)
+
+    report = commands.add_parser("report", help="Print habit, streak, log, period or dashboard reports.")
+    reports = report.add_subparsers(dest="report", required=True)
+    habits = reports.add_parser("habits", help="List habits.")
+    habits.add_argument("--periodicity", choices=("all",) + PERIODICITIES, default="all")
+    streaks = reports.add_parser("streaks", help="Current streaks, or the longest streak of one habit.")
+    streaks.add_argument("habit", nargs="?")
+    log = reports.add_parser("log", help="Log of a habit.")
+    log.add_argument("habit")
+    log.add_argument("--start", help="Earliest completion time to show (ISO-8601).")
+    log.add_argument("--end", help="Completion time to stop before (ISO-8601).")
+    periods = reports.add_parser("periods", help="Completions of a habit per day, week or month.")
+    periods.add_argument("habit")
+    periods.add_argument("--grain", choices=db.ROLLUP_GRAINS, default="week")
+    periods.add_argument("--start", help="First period to show, e.g. 2024-01-05, 2024-W01 or 2024-01.")
+    periods.add_argument("--end", help="Last period to show, like --start.")
+    dashboard = reports.add_parser("dashboard", help="Completion rates and streaks over all habits (needs NumPy).")
+    dashboard.add_argument("--top", type=int, default=5, help="Number of best and worst habits to list.")
+    dashboard.add_argument("--as-of", help="Reference time (ISO-8601, default: now).")
+    report.set_defaults(run=command_report)
+
+    rebuild = commands.add_parser("rebuild-rollups", help="Recompute the per-period completion counts from the log.")
+    rebuild.set_defaults(run=command_rebuild_rollups)
+
+    serve = commands.add_parser("serve", help="Serve habits, completions, streaks and logs as a JSON HTTP API.")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    serve.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080).")
+    serve.add_argument("--workers", type=int, default=8, help="Number of worker threads (default: 8).")
+    serve.add_argument("--verbose", action="store_true", help="Log every request.")
+    serve.set_defaults(run=command_serve)
+    return parser
+
+
+def main(argv=None, stdin=None):
+    """
+    Function to run a command.
+
+    :param argv: Command line arguments (default: sys.argv[1:]).
+    :param stdin: Stream read for '-' (default: sys.stdin).
+    :return: Exit status.
+    """
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as stop:
+        return stop.code
+    try:
+        return args.run(args, stdin if stdin is not None else sys.stdin)
+    except ValueError as exception:
+        error(exception)
+        return EXIT_USAGE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
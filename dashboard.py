@@ -0,0 +1,353 @@
+"""
+The dashboard module computes analytics for all habits at once.
+
+habit_log is loaded into a columnar HabitLog (habit number, epoch time and completed flag per row), and every
+statistic is a handful of vectorized NumPy operations over those arrays instead of one query per habit, so a
+fleet-wide dashboard over millions of log rows takes a fraction of a second once the log is loaded.
+
+A row counts as a completion when it carries a streak, like in the streaks module; the row written when a
+habit is created or its periodicity changes does not. Periods follow the calendar: days, weeks starting on
+Monday and months. Timestamps are taken as they are stored, without any time zone conversion.
+
+NumPy is needed for this module only: pip install numpy
+"""
+
+import calendar
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError as exception:
+    raise ImportError("The dashboard module requires NumPy, install it with 'pip install numpy'") from exception
+
+from db import TIME_FORMAT, as_connection, user_of
+from periods import EPOCH_ORDINAL, PERIODICITIES
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+DAY = 86400
+# Month index of January 1970 in periods.period_index, where NumPy's datetime64[M] counts from.
+EPOCH_MONTH = 1970 * 12
+
+# Habits of the connection's user are numbered 0..n-1 in name order. Habits without a creation time start
+# at their first log row.
+HABITS_QUERY = """SELECT habit, periodicity, CAST(strftime('%s', COALESCE(creation_time,
+                         (SELECT MIN(completion_time) FROM habit_log
+                          WHERE habit_log.user = :user AND habit_log.habit = habit_tracker.habit)))
+                         AS INTEGER)
+                  FROM habit_tracker WHERE user = :user ORDER BY habit"""
+# The log is read in the order of the habit_log_habit_time index as a single packed column,
+# (epoch seconds << 1) | completed, which is about half the cost of a row of separate values.
+# Joining habit_tracker for the habit numbers would cost more than the rest of the query, so
+# they are rebuilt from the number of rows per habit instead.
+LOG_WHERE = """WHERE user = :user AND completion_time IS NOT NULL
+               AND habit IN (SELECT habit FROM habit_tracker WHERE user = :user)"""
+LOG_COUNTS_QUERY = f"SELECT habit, COUNT(*) FROM habit_log {LOG_WHERE} GROUP BY habit ORDER BY habit"
+LOG_QUERY = f"""SELECT (CAST(ROUND((julianday(completion_time) - 2440587.5) * 86400) AS INTEGER) << 1) | (streak > 0)
+                FROM habit_log {LOG_WHERE} ORDER BY habit, completion_time"""
+
+
+class HabitLog:
+    """
+    Columnar copy of habit_log.
+
+    names, periodicity (index into PERIODICITIES) and created (epoch seconds) have one entry per habit;
+    habit (habit number), time (epoch seconds) and completed have one entry per log row, sorted by habit and time.
+    Results derived from the arrays and shared by several statistics are kept in cache.
+    """
+
+    def __init__(self, names, periodicity, created, habit, time, completed):
+        self.names = names
+        self.periodicity = periodicity
+        self.created = created
+        self.habit = habit
+        self.time = time
+        self.completed = completed
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.habit)
+
+
+def load(db):
+    """
+    Function to load the habits of the connection's user and their log into a HabitLog.
+    The queries run in one read transaction, so they see the same snapshot while other connections write.
+
+    :param db: To maintain connection with DB.
+    :return: HabitLog.
+    """
+    params = {"user": user_of(db)}
+    own = not db.in_transaction
+    if own:
+        db.execute("BEGIN")
+    try:
+        habits = db.execute(HABITS_QUERY, params).fetchall()
+        counts = dict(db.execute(LOG_COUNTS_QUERY, params).fetchall())
+        packed = np.fromiter((row[0] for row in db.execute(LOG_QUERY, params)), dtype=np.int64)
+    finally:
+        if own:
+            db.commit()
+    names = [row[0] for row in habits]
+    rows = np.array([counts.get(name, 0) for name in names], dtype=np.int64)
+    now = epoch()
+    periodicity = np.array([PERIODICITIES.index(row[1]) if row[1] in PERIODICITIES else 0 for row in habits],
+                           dtype=np.int8)
+    created = np.array([row[2] if row[2] is not None else now for row in habits], dtype=np.int64)
+    habit = np.repeat(np.arange(len(names), dtype=np.int64), rows)
+    return HabitLog(names, periodicity, created, habit, packed >> 1, (packed & 1).astype(bool))
+
+
+def epoch(as_of=None):
+    """
+    Function to convert a reference time to epoch seconds on the same scale as HabitLog.time.
+
+    :param as_of: datetime, or timestamp in db.TIME_FORMAT. Empty param uses the current time.
+    :return: Epoch seconds.
+    """
+    if as_of is None:
+        as_of = datetime.now()
+    elif isinstance(as_of, str):
+        as_of = datetime.strptime(as_of, TIME_FORMAT)
+    return calendar.timegm(as_of.timetuple())
+
+
+def period_numbers(days, periodicity):
+    """
+    Function to number the periods days fall in: the day itself, the week (starting on Monday) or the month.
+    Numbers are the indexes of periods.period_index, computed for whole arrays at once.
+
+    :param days: Array of day numbers (epoch seconds // DAY).
+    :param periodicity: Array of indexes into PERIODICITIES, one per day or a single one.
+    :return: Array of period numbers.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    periodicity = np.broadcast_to(periodicity, days.shape)
+    periods = np.array(days + EPOCH_ORDINAL)
+    weekly = periodicity == 1
+    periods[weekly] = (periods[weekly] - 1) // 7
+    monthly = periodicity == 2
+    periods[monthly] = days[monthly].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) + EPOCH_MONTH
+    return periods
+
+
+def _unique_pairs(habit, period):
+    """
+    Function to drop repeated (habit, period) pairs from pairs sorted by habit and period.
+    """
+    keep = np.ones(len(habit), dtype=bool)
+    keep[1:] = (habit[1:] != habit[:-1]) | (period[1:] != period[:-1])
+    return habit[keep], period[keep]
+
+
+def completed_periods(log):
+    """
+    Function to find the periods in which each habit was completed at least once.
+
+    :param log: HabitLog.
+    :return: Arrays of habit numbers and period numbers, sorted by habit and period.
+    """
+    if "periods" not in log.cache:
+        habit = log.habit[log.completed]
+        log.cache["periods"] = _unique_pairs(habit, period_numbers(log.time[log.completed] // DAY,
+                                                                   log.periodicity[habit]))
+    return log.cache["periods"]
+
+
+def completed_days(log):
+    """
+    Function to find the days on which each habit was completed at least once.
+
+    :param log: HabitLog.
+    :return: Arrays of habit numbers and day numbers, sorted by habit and day.
+    """
+    if "days" not in log.cache:
+        log.cache["days"] = _unique_pairs(log.habit[log.completed], log.time[log.completed] // DAY)
+    return log.cache["days"]
+
+
+def completion_rates(log, as_of=None):
+    """
+    Function to get the share of periods since each habit was created in which it was completed.
+
+    :param log: HabitLog.
+    :param as_of: Reference time, see epoch. The current period counts as due.
+    :return: Array of rates between 0 and 1, one per habit.
+    """
+    habit, _ = completed_periods(log)
+    done = np.bincount(habit, minlength=len(log.names))
+    first = period_numbers(log.created // DAY, log.periodicity)
+    last = period_numbers(np.full(len(log.names), epoch(as_of) // DAY), log.periodicity)
+    return np.minimum(done / np.maximum(last - first + 1, 1), 1.0)
+
+
+def streak_runs(log):
+    """
+    Function to split each habit's completed periods into runs of consecutive periods.
+
+    :param log: HabitLog.
+    :return: Arrays of habit number, last period number and length of each run, sorted by habit and period.
+    """
+    habit, period = completed_periods(log)
+    starts = np.ones(len(habit), dtype=bool)
+    starts[1:] = (habit[1:] != habit[:-1]) | (period[1:] != period[:-1] + 1)
+    ends = np.ones(len(habit), dtype=bool)
+    ends[:-1] = starts[1:]
+    return habit[starts], period[ends], np.bincount(np.cumsum(starts) - 1).astype(np.int64)
+
+
+def streak_stats(log, as_of=None):
+    """
+    Function to get current and longest streaks of every habit and the distribution of streak lengths.
+    A streak is current while its habit was completed in this or the previous period.
+
+    :param log: HabitLog.
+    :param as_of: Reference time, see epoch.
+    :return: Dict with 'current' and 'longest' (one entry per habit) and 'distribution',
+        the number of streaks of each length.
+    """
+    count = len(log.names)
+    habit, end, length = streak_runs(log)
+    longest = np.zeros(count, dtype=np.int64)
+    np.maximum.at(longest, habit, length)
+    distribution = np.bincount(length, minlength=1)
+    last = np.ones(len(habit), dtype=bool)
+    last[:-1] = habit[1:] != habit[:-1]
+    habit, end, length = habit[last], end[last], length[last]
+    now = period_numbers(np.full(len(habit), epoch(as_of) // DAY), log.periodicity[habit])
+    current = np.zeros(count, dtype=np.int64)
+    alive = end >= now - 1
+    current[habit[alive]] = length[alive]
+    return {"current": current, "longest": longest, "distribution": distribution}
+
+
+def weekday_adherence(log, as_of=None):
+    """
+    Function to get, for every habit and weekday, the share of those weekdays since the habit was created
+    on which it was completed.
+
+    :param log: HabitLog.
+    :param as_of: Reference time, see epoch.
+    :return: Array of rates with one row per habit and one column per weekday, Monday first.
+    """
+    count = len(log.names)
+    habit, day = completed_days(log)
+    done = np.bincount(habit * 7 + (day + 3) % 7, minlength=count * 7).reshape(count, 7)
+    first = (log.created // DAY)[:, None]
+    last = epoch(as_of) // DAY
+    # Days d falling on weekday w satisfy d % 7 == (w - 3) % 7.
+    remainder = (np.arange(7) - 3) % 7
+    due = (last - remainder) // 7 - (first - 1 - remainder) // 7
+    return np.minimum(done / np.maximum(due, 1), 1.0)
+
+
+def month_adherence(log, months=12, as_of=None):
+    """
+    Function to get, for every habit and each of the last months, the share of due periods it was completed in.
+    A week belongs to the month its Monday falls in.
+
+    :param log: HabitLog.
+    :param months: Number of months up to and including the current one.
+    :param as_of: Reference time, see epoch.
+    :return: Array with one row per habit and one column per month, oldest first, and the first month as
+        'YYYY-MM'. Months before a habit was created are NaN.
+    """
+    today = epoch(as_of) // DAY
+    last_month = period_numbers(today, 2)
+    month = np.arange(last_month - months + 1, last_month + 1)
+    first_day = (month - EPOCH_MONTH).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    last_day = (month + 1 - EPOCH_MONTH).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) - 1
+    low = np.maximum(first_day, (log.created // DAY)[:, None])
+    high = np.minimum(last_day, today)
+    # Mondays d satisfy d % 7 == 4.
+    mondays = (high - 4) // 7 - (low - 5) // 7
+    periodicity = log.periodicity[:, None]
+    due = np.where(periodicity == 0, high - low + 1, np.where(periodicity == 1, mondays, (high >= low) * 1))
+    due = np.maximum(due, 0)
+
+    habit, period = completed_periods(log)
+    kind = log.periodicity[habit]
+    day = np.where(kind == 1, period * 7 + 1, period) - EPOCH_ORDINAL  # the day, or the Monday of the week
+    column = np.where(kind == 2, period, period_numbers(day, 2)) - month[0]
+    inside = (column >= 0) & (column < months)
+    done = np.bincount(habit[inside] * months + column[inside],
+                       minlength=len(log.names) * months).reshape(len(log.names), months)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(due > 0, np.minimum(done / due, 1.0), np.nan)
+    return rates, str((month[0] - EPOCH_MONTH).astype("datetime64[M]"))
+
+
+def rolling_completions(log, window=7, days=28, as_of=None):
+    """
+    Function to count, for every habit, the days with a completion in a trailing window ending on each of
+    the last days.
+
+    :param log: HabitLog.
+    :param window: Length of the window in days.
+    :param days: Number of window end days, up to and including today.
+    :param as_of: Reference time, see epoch.
+    :return: Array of counts with one row per habit and one column per day, oldest first.
+    """
+    width = days + window - 1
+    start = epoch(as_of) // DAY - width + 1
+    habit, day = completed_days(log)
+    inside = (day >= start) & (day < start + width)
+    grid = np.zeros((len(log.names), width + 1), dtype=np.int32)
+    grid[habit[inside], day[inside] - start + 1] = 1
+    total = np.cumsum(grid, axis=1)
+    return total[:, window:] - total[:, :days]
+
+
+def summary(db, as_of=None):
+    """
+    Function to compute the dashboard statistics of every habit.
+
+    :param db: To maintain connection with DB.
+    :param as_of: Reference time, see epoch.
+    :return: Dict of the HabitLog and the results of the functions above.
+    """
+    log = load(db)
+    streaks = streak_stats(log, as_of)
+    monthly, first_month = month_adherence(log, as_of=as_of)
+    return {
+        "log": log,
+        "completion_rate": completion_rates(log, as_of),
+        "current_streak": streaks["current"],
+        "longest_streak": streaks["longest"],
+        "streak_distribution": streaks["distribution"],
+        "weekday_adherence": weekday_adherence(log, as_of),
+        "month_adherence": monthly,
+        "first_month": first_month,
+        "last_7_days": rolling_completions(log, 7, 1, as_of)[:, -1],
+    }
+
+
+def show_dashboard(database="main.db", top=5, as_of=None):
+    """
+    Function to show fleet-wide statistics over all habits.
+
+    :param database: Name of DB to read from (default: main.db), or an open connection such as a user's one.
+    :param top: Number of habits to list with the highest and lowest completion rates.
+    :param as_of: Reference time, see epoch.
+    """
+    data = summary(as_connection(database), as_of)
+    log = data["log"]
+    if not log.names:
+        print("\nLooks empty in here! Please add a habit first.\n")
+        return
+    rate = data["completion_rate"]
+    print(f"\n{'-' * 75}")
+    print(f"Habits: {len(log.names)} | Log rows: {len(log)} | Completions: {int(log.completed.sum())}")
+    print(f"Average completion rate: {rate.mean():.0%} | "
+          f"Streaks going: {int((data['current_streak'] > 0).sum())} | "
+          f"Longest streak: {int(data['longest_streak'].max())}")
+    distribution = data["streak_distribution"]
+    print("Streak lengths: " + ", ".join(f"{length}: {int(distribution[length])}"
+                                         for length in np.flatnonzero(distribution)[:10]))
+    daily = log.periodicity == 0
+    if daily.any():
+        weekdays = data["weekday_adherence"][daily].mean(axis=0)
+        print("Daily habits by weekday: " + " ".join(f"{name} {value:.0%}" for name, value in zip(WEEKDAYS, weekdays)))
+    order = np.argsort(-rate, kind="stable")
+    print("Best: " + ", ".join(f"{log.names[i].capitalize()} {rate[i]:.0%}" for i in order[:top]))
+    print("Needs work: " + ", ".join(f"{log.names[i].capitalize()} {rate[i]:.0%}" for i in order[::-1][:top]))
+    print(f"{'-' * 75}\n")
@@ -2,26 +2,607 @@
 The database module serves as the primary entity responsible for creating database tables, storing information, and facilitating the retrieval of data.
 """
 
+import functools
+import json
+import os
+import random
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import NamedTuple, Optional
 
+# Timestamps are stored as ISO-8601 text so they sort lexically and work with SQLite's date functions.
+TIME_FORMAT = "%Y-%m-%d %H:%M"
 
-def connect_database(name="main.db"):
+LEGACY_TIME_FORMAT = "%m/%d/%Y %H:%M"
+
+# Seconds a connection waits for another connection's lock before SQLite reports "database is locked".
+BUSY_TIMEOUT = 5.0
+# Journal mode of file databases. WAL lets readers carry on while a writer commits, and writers only
+# wait for each other; set "DELETE" before connecting to use SQLite's default rollback journal.
+JOURNAL_MODE = "WAL"
+# Attempts at taking the write lock, and the first delay between them in seconds, once the busy timeout has run out.
+WRITE_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+
+def local_time(value):
+    """
+    This function converts an aware datetime to naive local time, the time every stored timestamp is in.
+    Naive datetimes are taken to be local time already and are returned as they are.
+
+    :param value: datetime.
+    :return: Naive datetime.
+    """
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+def parse_time(value):
+    """
+    This function converts a stored timestamp to a datetime without going through strptime.
+    Times with a UTC offset are converted to local time, see local_time.
+
+    :param value: Timestamp in TIME_FORMAT, or in LEGACY_TIME_FORMAT, or a datetime.
+    :return: Naive datetime, or None for None.
+    """
+    if value is None:
+        return value
+    if isinstance(value, datetime):
+        return local_time(value)
+    if value[2:3] == "/":
+        return datetime.strptime(value, LEGACY_TIME_FORMAT)
+    return local_time(datetime.fromisoformat(value))
+
+
+def format_time(value):
+    """
+    This function converts a datetime to a timestamp in TIME_FORMAT.
+
+    :param value: Naive datetime in local time, as returned by parse_time.
+    :return: Timestamp in TIME_FORMAT.
+    """
+    # Same text as strftime(TIME_FORMAT), built without parsing the format string.
+    return value.isoformat(" ", "minutes")
+
+
+# SQL expression rewriting a legacy "%m/%d/%Y %H:%M" value in {column} to TIME_FORMAT.
+_ISO_FROM_LEGACY = """CASE WHEN {column} GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]*'
+    THEN substr({column}, 7, 4) || '-' || substr({column}, 1, 2) || '-' || substr({column}, 4, 2) || substr({column}, 11)
+    ELSE {column} END"""
+
+# Grains of the habit_rollup table and the SQL expression giving the period an ISO timestamp in {column} falls in:
+# the day ('2024-01-05'), the ISO week ('2024-W01', the week of the year its Thursday falls in) or the month ('2024-01').
+_THURSDAY = "date({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days', '+3 days')"
+_ROLLUP_PERIODS = {
+    "day": "date({column})",
+    "week": "strftime('%Y', {thursday}) || '-W' || printf('%02d', (CAST(strftime('%j', {thursday}) AS INTEGER) + 6) / 7)"
+            .replace("{thursday}", _THURSDAY),
+    "month": "strftime('%Y-%m', {column})",
+}
+ROLLUP_GRAINS = tuple(_ROLLUP_PERIODS)
+
+
+def _rollup_periods(row):
+    return ", ".join(f"('{grain}', {period.format(column=row + '.completion_time')})"
+                     for grain, period in _ROLLUP_PERIODS.items())
+
+
+def _rollup_statements(key):
+    """
+    SQL of the triggers keeping habit_rollup in step with the completions (rows with a streak) in habit_log,
+    and of the statements filling it from scratch, for rollups keyed by the habit_log columns in key.
+
+    :return: Tuple of the statement adding a row's completion, the statements removing it, and the rebuild statements.
+    """
+    columns = ", ".join(key)
+    when = "{row}.streak > 0 AND {row}.habit IS NOT NULL AND date({row}.completion_time) IS NOT NULL"
+    add = f"""INSERT INTO habit_rollup ({columns}, grain, period, completions)
+        SELECT {", ".join("NEW." + column for column in key)}, column1, column2, 1 FROM (VALUES {_rollup_periods("NEW")})
+        WHERE {when.format(row="NEW")}
+        ON CONFLICT ({columns}, grain, period) DO UPDATE SET completions = completions + 1;"""
+    match = " AND ".join(f"{column} = OLD.{column}" for column in key)
+    remove = f"""UPDATE habit_rollup SET completions = completions - 1
+        WHERE {when.format(row="OLD")} AND {match} AND (grain, period) IN (VALUES {_rollup_periods("OLD")});
+        DELETE FROM habit_rollup WHERE {match} AND completions <= 0;"""
+    rebuild = tuple(
+        f"""INSERT INTO habit_rollup ({columns}, grain, period, completions)
+            SELECT {columns}, '{grain}', {period.format(column="completion_time")}, COUNT(*) FROM habit_log
+            WHERE {when.format(row="habit_log")} GROUP BY {columns}, {len(key) + 2}"""
+        for grain, period in _ROLLUP_PERIODS.items())
+    return add, remove, rebuild
+
+
+# Rollups per habit, as created by migration 5, and per user and habit since migration 6.
+_HABIT_ROLLUP_ADD, _HABIT_ROLLUP_REMOVE, _HABIT_ROLLUP_REBUILD = _rollup_statements(("habit",))
+_ROLLUP_ADD, _ROLLUP_REMOVE, _ROLLUP_REBUILD = _rollup_statements(("user", "habit"))
+
+
+class HabitRecord(NamedTuple):
+    """
+    A row of 'habit_tracker'. Records are plain tuples without a per-instance __dict__,
+    so they index and unpack like the rows they replace.
+    """
+    habit: str
+    periodicity: str
+    category: str
+    creation_time: str
+    streak: int
+    completion_time: Optional[str]
+    longest_streak: int
+
+
+class HabitState(NamedTuple):
+    """
+    The part of a 'habit_tracker' row needed to update progress on a habit.
+    """
+    periodicity: str
+    streak: int
+    completion_time: Optional[str]
+
+
+class LogEntry(NamedTuple):
+    """
+    A row of 'habit_log', without its id.
+    """
+    habit: str
+    completed: bool
+    streak: int
+    completion_time: str
+
+
+def connect_database(name="main.db", user=""):
     """
     This function establishes and manages a connection with the database.
+    Every call opens a new, unpooled connection; use get_connection to share one.
 
     name: Name of DB to create or connect to (default: main.db).
+    user: User whose habits the connection works on (default: '').
     returns: DB connection.
     """
-    db = sqlite3.connect(name)
+    db = sqlite3.connect(name, timeout=BUSY_TIMEOUT, factory=Connection)
+    db.user = user
     create_tables(db)
+    configure_connection(db)
     return db
 
 
+def configure_connection(db):
+    """
+    This function applies the per-connection settings every connection needs: enforcing foreign keys
+    and the JOURNAL_MODE of the database file.
+
+    :param db: To maintain connection with DB.
+    """
+    db.execute("PRAGMA foreign_keys = ON")
+    mode = db.execute("PRAGMA journal_mode").fetchone()[0]
+    if mode != "memory" and mode.upper() != JOURNAL_MODE.upper():
+        # Changing the journal mode needs a moment without other writers.
+        retry_busy(db.execute, f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    if JOURNAL_MODE.upper() == "WAL":
+        # Durable across application crashes; a power loss may only undo the last commits.
+        db.execute("PRAGMA synchronous = NORMAL")
+
+
+class Connection(sqlite3.Connection):
+    """
+    Connection that carries a read cache for the habit and category lookups of this module,
+    and the user whose habits the functions of this module read and write through it.
+    Used by connect_database and the connection pool; pooled connections work on user '' and are
+    shared by the other users through UserConnection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = {}
+        self.cache_version = None
+        self.user = ""
+
+
+class UserConnection:
+    """
+    One user's view of a connection: the functions of this module, analytics and Habit read and write
+    that user's habits through it, and everything else is passed on to the underlying connection.
+    Views of a connection share its transactions and read cache, so a user costs no connection of its own.
+    """
+    __slots__ = ("base", "user")
+
+    def __init__(self, base, user):
+        self.base = base
+        self.user = user
+
+    def __getattr__(self, name):
+        return getattr(self.base, name)
+
+
+def base_connection(db):
+    """
+    This function returns the connection underneath a UserConnection, or the connection itself.
+
+    :param db: To maintain connection with DB.
+    :return: sqlite3 connection.
+    """
+    return db.base if isinstance(db, UserConnection) else db
+
+
+def user_of(db):
+    """
+    This function returns the user a connection works on; '' for connections not opened by this module.
+
+    :param db: To maintain connection with DB.
+    :return: Name of user.
+    """
+    return getattr(db, "user", "")
+
+
+def cached(db, key, load):
+    """
+    This function returns a cached query result, running load() on a miss.
+    The cache is dropped whenever 'PRAGMA data_version' shows another connection has committed,
+    and by invalidate_cache after writes made through this connection. Connections without a
+    cache (not opened by this module) always run load().
+
+    :param db: To maintain connection with DB.
+    :param key: Cache key of the result.
+    :param load: Function running the query.
+    :return: Result of load().
+    """
+    # Users share a connection's cache, so their results are told apart by user.
+    key = (user_of(db), key)
+    db = base_connection(db)
+    cache = getattr(db, "cache", None)
+    if cache is None:
+        return load()
+    version = db.execute("PRAGMA data_version").fetchone()[0]
+    if version != db.cache_version:
+        cache.clear()
+        db.cache_version = version
+    if key not in cache:
+        cache[key] = load()
+    return cache[key]
+
+
+def invalidate_cache(db):
+    """
+    This function drops cached results of the connection.
+    Write helpers call it themselves; call it after changing habit_tracker with raw SQL.
+
+    :param db: To maintain connection with DB.
+    """
+    cache = getattr(db, "cache", None)
+    if cache is not None:
+        cache.clear()
+
+
+class ConnectionPool:
+    """
+    Process-wide registry of database connections.
+
+    Connections are kept per database path and thread, so a thread always gets back the
+    connection it opened. Users share it, see get_connection. Tables are created only once per database path for the life of the pool.
+    The pool can be used as a context manager, which closes every connection on exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._bootstrapped = set()
+
+    @staticmethod
+    def _key(name):
+        return name if name == ":memory:" else os.path.abspath(name)
+
+    def get(self, name="main.db"):
+        """
+        Function to get the calling thread's connection to the specified database, opening it if needed.
+
+        :param name: Name of DB to connect to (default: main.db).
+        :return: DB connection.
+        """
+        path = self._key(name)
+        key = (path, threading.get_ident())
+        with self._lock:
+            db = self._connections.get(key)
+            if db is not None and not _is_open(db):
+                del self._connections[key]
+                db = None
+            if db is None:
+                # The pool may close connections from any thread; callers still only see their own.
+                db = sqlite3.connect(name, timeout=BUSY_TIMEOUT, check_same_thread=False, factory=Connection)
+                if path not in self._bootstrapped or path == ":memory:":
+                    create_tables(db)
+                    self._bootstrapped.add(path)
+                configure_connection(db)
+                self._connections[key] = db
+            return db
+
+    def close(self, name=None):
+        """
+        Function to close pooled connections.
+
+        :param name: Name of DB whose connections are closed. Empty param closes every connection.
+        """
+        path = None if name is None else self._key(name)
+        with self._lock:
+            for key in [k for k in self._connections if path is None or k[0] == path]:
+                self._connections.pop(key).close()
+            if path is None:
+                self._bootstrapped.clear()
+            else:
+                self._bootstrapped.discard(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _is_open(db):
+    try:
+        db.total_changes
+    except sqlite3.ProgrammingError:
+        return False
+    return True
+
+
+pool = ConnectionPool()
+
+
+def get_connection(name="main.db", user=""):
+    """
+    This function returns the calling thread's pooled connection to the database.
+    Every user gets the same connection, seen through a UserConnection for users other than ''.
+
+    :param name: Name of DB to create or connect to (default: main.db).
+    :param user: User whose habits the connection works on (default: '').
+    :return: DB connection.
+    """
+    db = pool.get(name)
+    return UserConnection(db, user) if user else db
+
+
+def as_connection(database, user=""):
+    """
+    This function returns an open connection as it is, or the calling thread's pooled connection to a database name.
+
+    :param database: Name of DB or an open connection, e.g. one from shards.ShardRouter.connection.
+    :param user: User of the pooled connection (default: ''); an open connection keeps its own user.
+    :return: DB connection.
+    """
+    if isinstance(database, (sqlite3.Connection, UserConnection)):
+        return database
+    return get_connection(database, user)
+
+
+def close_connections(name=None):
+    """
+    This function closes pooled connections.
+
+    :param name: Name of DB whose connections are closed. Empty param closes every connection.
+    """
+    pool.close(name)
+
+
+# Depth of open transaction scopes per connection; helpers never commit while a scope is open.
+_transaction_depth = {}
+
+
+@contextmanager
+def transaction(db):
+    """
+    This function opens a unit of work on the connection.
+    Helpers called inside the scope do not commit; the whole scope is committed once on exit,
+    or rolled back if an exception escapes. Nested scopes join the outermost one.
+    The outermost scope takes the write lock up front with BEGIN IMMEDIATE, so concurrent writers
+    wait for each other at the start instead of failing half way, see retry_busy.
+
+    :param db: To maintain connection with DB.
+    """
+    # Scopes are counted per underlying connection, which the views of its users share.
+    key = id(base_connection(db))
+    depth = _transaction_depth.get(key, 0)
+    _transaction_depth[key] = depth + 1
+    try:
+        if depth == 0 and not db.in_transaction:
+            retry_busy(db.execute, "BEGIN IMMEDIATE")
+        yield db
+    except BaseException:
+        if depth == 0:
+            db.rollback()
+            invalidate_cache(db)
+        raise
+    else:
+        if depth == 0:
+            retry_busy(db.commit)
+    finally:
+        if depth == 0:
+            del _transaction_depth[key]
+        else:
+            _transaction_depth[key] = depth
+
+
+def in_transaction(db):
+    """
+    This function checks whether a transaction scope is open on the connection.
+
+    :param db: To maintain connection with DB.
+    :return: True if called inside a transaction scope; False otherwise.
+    """
+    return id(base_connection(db)) in _transaction_depth
+
+
+def _commit(db, commit):
+    if commit and not in_transaction(db):
+        db.commit()
+
+
+def _is_busy(exception):
+    message = str(exception)
+    return "locked" in message or "busy" in message
+
+
+def retry_busy(operation, *args):
+    """
+    This function runs an operation, retrying with exponential backoff and jitter while another connection
+    holds the database lock past the busy timeout.
+
+    :param operation: Callable such as db.execute or db.commit.
+    :param args: Arguments for the operation.
+    :return: Result of the operation.
+    """
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            return operation(*args)
+        except sqlite3.OperationalError as exception:
+            if attempt == WRITE_ATTEMPTS - 1 or not _is_busy(exception):
+                raise
+            time.sleep(RETRY_DELAY * 2 ** attempt * random.uniform(1, 2))
+
+
+def _writes(helper):
+    """
+    Decorator for write helpers. Called with commit=True outside a transaction, the helper runs in a
+    transaction of its own, so it takes the write lock up front with retries like any other scope.
+    """
+    # Arguments come first in co_varnames; inspect.signature would cost more to import than the rest of db.
+    position = helper.__code__.co_varnames.index("commit")
+
+    @functools.wraps(helper)
+    def write(db, *args, **kwargs):
+        commit = args[position - 1] if len(args) >= position else kwargs.get("commit", True)
+        if commit and not in_transaction(db) and not db.in_transaction:
+            with transaction(db):
+                return helper(db, *args, **kwargs)
+        return helper(db, *args, **kwargs)
+    return write
+
+
+# Rows of habit_rollup and habit_log whose habit is not in habit_tracker.
+_ORPHAN_ROLLUPS = """DELETE FROM habit_rollup WHERE NOT EXISTS (
+    SELECT 1 FROM habit_tracker t WHERE t.user = habit_rollup.user AND t.habit = habit_rollup.habit)"""
+_ORPHAN_LOGS = """DELETE FROM habit_log WHERE NOT EXISTS (
+    SELECT 1 FROM habit_tracker t WHERE t.user = habit_log.user AND t.habit = habit_log.habit)"""
+
+# Schema changes applied on top of the original tables, in order. Each entry moves the
+# database up one 'PRAGMA user_version'; never edit an entry once released, append a new one.
+MIGRATIONS = [
+    # 1: Surrogate key, cascading foreign key and a (habit, completion_time) index for habit_log.
+    (
+        """CREATE TABLE habit_log_new (
+            id INTEGER PRIMARY KEY,
+            habit TEXT,
+            completed BOOL,
+            streak INT DEFAULT 0,
+            completion_time TIME,
+            FOREIGN KEY (habit) REFERENCES habit_tracker(habit) ON DELETE CASCADE
+        )""",
+        """INSERT INTO habit_log_new (habit, completed, streak, completion_time)
+            SELECT habit, completed, streak, completion_time FROM habit_log ORDER BY rowid""",
+        "DROP TABLE habit_log",
+        "ALTER TABLE habit_log_new RENAME TO habit_log",
+        "CREATE INDEX habit_log_habit_time ON habit_log (habit, completion_time)",
+    ),
+    # 2: Rewrite "%m/%d/%Y %H:%M" timestamps to TIME_FORMAT.
+    (
+        f"""UPDATE habit_tracker SET creation_time = {_ISO_FROM_LEGACY.format(column="creation_time")},
+            completion_time = {_ISO_FROM_LEGACY.format(column="completion_time")}""",
+        f"UPDATE habit_log SET completion_time = {_ISO_FROM_LEGACY.format(column='completion_time')}",
+    ),
+    # 3: Longest streak kept on habit_tracker, backfilled from the log.
+    (
+        "ALTER TABLE habit_tracker ADD COLUMN longest_streak INT DEFAULT 0",
+        """UPDATE habit_tracker SET longest_streak = COALESCE(
+            (SELECT MAX(streak) FROM habit_log WHERE habit_log.habit = habit_tracker.habit), 0)""",
+    ),
+    # 4: Index for category listings and category removal.
+    (
+        "CREATE INDEX habit_tracker_category ON habit_tracker (category)",
+    ),
+    # 5: Completions per habit per day, ISO week and month, kept up to date by triggers on habit_log.
+    (
+        """CREATE TABLE habit_rollup (
+            habit TEXT NOT NULL,
+            grain TEXT NOT NULL,
+            period TEXT NOT NULL,
+            completions INT NOT NULL,
+            PRIMARY KEY (habit, grain, period)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX habit_rollup_period ON habit_rollup (grain, period)",
+        f"CREATE TRIGGER habit_log_rollup_insert AFTER INSERT ON habit_log BEGIN {_HABIT_ROLLUP_ADD} END",
+        f"CREATE TRIGGER habit_log_rollup_delete AFTER DELETE ON habit_log BEGIN {_HABIT_ROLLUP_REMOVE} END",
+        f"""CREATE TRIGGER habit_log_rollup_update AFTER UPDATE OF habit, streak, completion_time ON habit_log
+            BEGIN {_HABIT_ROLLUP_REMOVE} {_HABIT_ROLLUP_ADD} END""",
+    ) + _HABIT_ROLLUP_REBUILD,
+    # 6: A user column on every table, so one database file holds the habits of many users, see shards.
+    # Habits are keyed by (user, habit); existing rows belong to the default user ''.
+    (
+        "DROP TRIGGER habit_log_rollup_insert",
+        "DROP TRIGGER habit_log_rollup_delete",
+        "DROP TRIGGER habit_log_rollup_update",
+        "DROP TABLE habit_rollup",
+        """CREATE TABLE habit_tracker_new (
+            habit TEXT,
+            periodicity TEXT,
+            category TEXT,
+            creation_time TEXT,
+            streak INT,
+            completion_time TEXT,
+            longest_streak INT DEFAULT 0,
+            user TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (user, habit)
+        )""",
+        """INSERT INTO habit_tracker_new (habit, periodicity, category, creation_time, streak, completion_time,
+                                          longest_streak)
+            SELECT habit, periodicity, category, creation_time, streak, completion_time, longest_streak
+            FROM habit_tracker""",
+        "DROP TABLE habit_tracker",
+        "ALTER TABLE habit_tracker_new RENAME TO habit_tracker",
+        "CREATE INDEX habit_tracker_category ON habit_tracker (user, category)",
+        """CREATE TABLE habit_log_new (
+            id INTEGER PRIMARY KEY,
+            habit TEXT,
+            completed BOOL,
+            streak INT DEFAULT 0,
+            completion_time TIME,
+            user TEXT NOT NULL DEFAULT '',
+            FOREIGN KEY (user, habit) REFERENCES habit_tracker(user, habit) ON DELETE CASCADE
+        )""",
+        """INSERT INTO habit_log_new (id, habit, completed, streak, completion_time)
+            SELECT id, habit, completed, streak, completion_time FROM habit_log""",
+        "DROP TABLE habit_log",
+        "ALTER TABLE habit_log_new RENAME TO habit_log",
+        "CREATE INDEX habit_log_habit_time ON habit_log (user, habit, completion_time)",
+        """CREATE TABLE habit_rollup (
+            user TEXT NOT NULL,
+            habit TEXT NOT NULL,
+            grain TEXT NOT NULL,
+            period TEXT NOT NULL,
+            completions INT NOT NULL,
+            PRIMARY KEY (user, habit, grain, period)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX habit_rollup_period ON habit_rollup (user, grain, period)",
+        f"CREATE TRIGGER habit_log_rollup_insert AFTER INSERT ON habit_log BEGIN {_ROLLUP_ADD} END",
+        f"CREATE TRIGGER habit_log_rollup_delete AFTER DELETE ON habit_log BEGIN {_ROLLUP_REMOVE} END",
+        f"""CREATE TRIGGER habit_log_rollup_update AFTER UPDATE OF user, habit, streak, completion_time ON habit_log
+            BEGIN {_ROLLUP_REMOVE} {_ROLLUP_ADD} END""",
+    ) + _ROLLUP_REBUILD,
+    # 7: One-off removal of the logs and rollups left behind by category removal before migration 1 made
+    # habit_log cascade; migration 1 copied them over, as migrations run with foreign keys off.
+    (
+        _ORPHAN_ROLLUPS,
+        _ORPHAN_LOGS,
+    ),
+]
+
+
 def create_tables(db):
     """
-    This function generates two database tables: 'habit_tracker' and 'habit_log'.
-    The 'habit_tracker' database includes columns such as habit, periodicity, category, creation_time, streak, and completion_time. 
-    The 'habit_log' database comprises columns like habit, completed, streak, and completion_time.
+    This function generates two database tables: 'habit_tracker' and 'habit_log', and migrates them to the latest schema.
+    The 'habit_tracker' database includes columns such as habit, periodicity, category, creation_time, streak, completion_time, longest_streak and user.
+    The 'habit_log' database comprises columns like id, habit, completed, streak, completion_time and user.
+    The 'habit_rollup' table, kept up to date from 'habit_log', counts completions per user, habit, grain and period.
     param: 'db' To maintain the connection with the database.
     """
     cur = db.cursor()
@@ -44,9 +625,49 @@ def create_tables(db):
             FOREIGN KEY (habit) REFERENCES habit_tracker(habit)
         )''')
     db.commit()
+    migrate(db)
+
+
+def schema_version(db):
+    """
+    This function returns the schema version the database has been migrated to.
 
+    :param db: To maintain connection with DB.
+    :return: Number of applied migrations.
+    """
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db):
+    """
+    This function applies every pending migration, each one in its own transaction.
+    Foreign keys are switched off while tables are rebuilt and restored afterwards.
 
-def add_habit(db, name, periodicity, category, creation_time, streak, progress_time=None):
+    :param db: To maintain connection with DB.
+    """
+    if schema_version(db) >= len(MIGRATIONS):
+        return
+    foreign_keys = db.execute("PRAGMA foreign_keys").fetchone()[0]
+    db.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for version, statements in enumerate(MIGRATIONS, start=1):
+            # BEGIN IMMEDIATE so concurrent processes migrate one at a time.
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(db) < version:
+                    for statement in statements:
+                        db.execute(statement)
+                    db.execute(f"PRAGMA user_version = {version}")
+            except BaseException:
+                db.rollback()
+                raise
+            db.commit()
+    finally:
+        db.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+
+
+@_writes
+def add_habit(db, name, periodicity, category, creation_time, streak, progress_time=None, commit=True):
     """
     This function inserts habit details into the 'habit_tracker' database.
     
@@ -57,15 +678,19 @@ def add_habit(db, name, periodicity, category, creation_time, streak, progress_t
     :param creation_time: Habit creation time.
     :param streak: Habit streak.
     :param progress_time: Time when progress on habit was updated.
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
     """
     cur = db.cursor()
-    cur.execute("INSERT INTO habit_tracker VALUES(?, ?, ?, ?, ?, ?)",
+    cur.execute("""INSERT INTO habit_tracker (habit, periodicity, category, creation_time, streak, completion_time,
+                                             longest_streak, user) VALUES(?, ?, ?, ?, ?, ?, ?, ?)""",
                 (name, periodicity, category,
-                 creation_time, streak, progress_time))
-    db.commit()
+                 creation_time, streak, progress_time, streak, user_of(db)))
+    invalidate_cache(db)
+    _commit(db, commit)
 
 
-def update_log(db, name, is_progressed, streak, progress_time):
+@_writes
+def update_log(db, name, is_progressed, streak, progress_time, commit=True):
     """
     This function modifies the 'habit_log' database using the provided information.
 
@@ -74,11 +699,28 @@ def update_log(db, name, is_progressed, streak, progress_time):
     :param is_progressed: Indicates whether progress has been made on habit.
     :param streak: Habit streak.
     :param progress_time: Time when progress on habit was updated.
-        """
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
+    """
     cur = db.cursor()
-    cur.execute("INSERT INTO habit_log VALUES(?, ?, ?, ?)",
-                (name, is_progressed, streak, progress_time))
-    db.commit()
+    cur.execute("INSERT INTO habit_log (habit, completed, streak, completion_time, user) VALUES(?, ?, ?, ?, ?)",
+                (name, is_progressed, streak, progress_time, user_of(db)))
+    _commit(db, commit)
+
+
+@_writes
+def update_logs(db, entries, commit=True):
+    """
+    This function inserts many rows into the 'habit_log' database with a single statement.
+
+    :param db: To maintain connection with DB.
+    :param entries: Iterable of (name, is_progressed, streak, progress_time) tuples.
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
+    """
+    cur = db.cursor()
+    user = user_of(db)
+    cur.executemany("INSERT INTO habit_log (habit, completed, streak, completion_time, user) VALUES(?, ?, ?, ?, ?)",
+                    ((*entry, user) for entry in entries))
+    _commit(db, commit)
 
 
 def habit_exists(db, name):
@@ -90,78 +732,118 @@ def habit_exists(db, name):
     :return: True if habit is already in the database; False otherwise.
     """
     cur = db.cursor()
-    query = """SELECT * FROM habit_tracker WHERE habit = ?"""
-    cur.execute(query, (name,))
+    query = """SELECT * FROM habit_tracker WHERE user = ? AND habit = ?"""
+    cur.execute(query, (user_of(db), name))
     data = cur.fetchone()
     return True if data is not None else False
 
 
-def remove_habit(db, name):
+@_writes
+def remove_habit(db, name, commit=True):
     """
     This function removes the specified habit from habit_tracker database.
-    Also simultaneously resets the log for that particular habit.
+    Also simultaneously resets the log for that particular habit, in the same transaction.
 
     :param db: To maintain connection with DB.
     :param name: Name of habit.
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
     """
     cur = db.cursor()
-    cur.execute(f"DELETE FROM habit_tracker WHERE habit == '{name}';")
-    db.commit()
-    reset_logs(db, name)
+    reset_logs(db, name, commit=False)
+    cur.execute("DELETE FROM habit_tracker WHERE user = ? AND habit = ?", (user_of(db), name))
+    invalidate_cache(db)
+    _commit(db, commit)
 
 
-def fetch_categories(db):
+def fetch_categories(db, prefix=None, limit=None):
     """
-    This function retrieves all categories stored in habit_tracker database.
+    This function retrieves distinct categories stored in habit_tracker database, in alphabetical order.
 
     :param db: To maintain connection with DB.
+    :param prefix: Only return categories starting with this text, ignoring case. Asked for on every keystroke
+        of a completion, such lookups are not cached.
+    :param limit: Return at most this many categories.
     :return: List of category names.
     """
-    cur = db.cursor()
-    cur.execute("SELECT category FROM habit_tracker")
-    data = cur.fetchall()
-    return [i[0].capitalize() for i in set(data)]
+    def load():
+        return [row[0].capitalize() for row in _list_column(db, "category", prefix, limit)]
+    return load() if prefix else list(cached(db, ("categories", limit), load))
 
 
-def remove_category(db, category_name):
+@_writes
+def remove_category(db, category_name, commit=True):
     """
-    This function removes the specified category and associated habits from habit_tracker database.
+    This function removes the specified category and associated habits from habit_tracker database,
+    together with their logs and rollups, in one transaction.
 
     :param db: To maintain connection with DB.
     :param category_name: Name of category
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
     """
     cur = db.cursor()
-    cur.execute(f"DELETE FROM habit_Tracker where category == '{category_name}';")
-    db.commit()
+    user = user_of(db)
+    habits = "SELECT habit FROM habit_tracker WHERE user = ? AND category = ?"
+    # The cascade from habit_tracker to habit_log only acts where foreign keys are on; the logs are deleted
+    # explicitly so removal is complete on any connection. Rollups go first, so the habit_log triggers find
+    # nothing left to count down, which the cascade would not spare them.
+    cur.execute(f"DELETE FROM habit_rollup WHERE user = ? AND habit IN ({habits})", (user, user, category_name))
+    cur.execute(f"DELETE FROM habit_log WHERE user = ? AND habit IN ({habits})", (user, user, category_name))
+    cur.execute("DELETE FROM habit_tracker WHERE user = ? AND category = ?", (user, category_name))
+    invalidate_cache(db)
+    _commit(db, commit)
 
 
-def fetch_habits(db):
+def fetch_habits(db, prefix=None, limit=None):
     """
-    This function retrieves all habits stored in habit_tracker database.
+    This function retrieves habits stored in habit_tracker database, in alphabetical order.
 
     :param db: To maintain connection with DB.
-    :return: List of habit names
+    :param prefix: Only return habits starting with this text, ignoring case; not cached, like in fetch_categories.
+    :param limit: Return at most this many habits.
+    :return: List of habit names; None if no habit matches.
     """
-    cur = db.cursor()
-    cur.execute("SELECT habit FROM habit_tracker")
-    data = cur.fetchall()
-    return [i[0].capitalize() for i in set(data)] if len(data) > 0 else None
+    def load():
+        return [row[0].capitalize() for row in _list_column(db, "habit", prefix, limit)] or None
+    if prefix:
+        return load()
+    habits = cached(db, ("habits", limit), load)
+    return list(habits) if habits is not None else None
+
 
+def _list_column(db, column, prefix, limit):
+    # Both columns are indexed after the user, so DISTINCT and ORDER BY walk the index and LIMIT stops the walk early.
+    query = f"SELECT DISTINCT {column} FROM habit_tracker WHERE user = ?"
+    params = [user_of(db)]
+    if prefix:
+        # Names are stored in lower case. A range on the column seeks in the index, where LIKE, which ignores
+        # case, cannot use the binary index; U+10FFFF sorts after every character that may follow the prefix.
+        prefix = prefix.lower()
+        query += f" AND {column} >= ? AND {column} < ?"
+        params += [prefix, prefix + "\U0010ffff"]
+    query += f" ORDER BY {column}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return db.execute(query, params).fetchall()
 
-def update_periodicity(db, name, new_periodicity):
+
+@_writes
+def update_periodicity(db, name, new_periodicity, commit=True):
     """
-    This function the periodicity of the specified habit to a new setting and concurrently resets the logs associated with that habit.
+    This function changes the periodicity of the specified habit to a new setting and clears its streak.
+    The log of the habit is kept so the streak can be recalculated from it, see streaks.recompute.
 
     :param db: To maintain connection with DB.
     :param name: Name of habit.
     :param new_periodicity: New periodicity to be assigned to habit
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
     """
     cur = db.cursor()
-    query = "UPDATE habit_tracker SET periodicity = ?, streak = 0, completion_time = NULL WHERE habit = ?"
-    data = (new_periodicity, name)
+    query = "UPDATE habit_tracker SET periodicity = ?, streak = 0, completion_time = NULL WHERE user = ? AND habit = ?"
+    data = (new_periodicity, user_of(db), name)
     cur.execute(query, data)
-    db.commit()
-    reset_logs(db, name)
+    invalidate_cache(db)
+    _commit(db, commit)
 
 
 def get_streak_count(db, name):
@@ -173,39 +855,138 @@ def get_streak_count(db, name):
     :return: Current streak of specified habit.
     """
     cur = db.cursor()
-    query = "SELECT streak FROM habit_tracker WHERE habit = ?"
-    cur.execute(query, (name,))
+    query = "SELECT streak FROM habit_tracker WHERE user = ? AND habit = ?"
+    cur.execute(query, (user_of(db), name))
     streak_count = cur.fetchall()
     return streak_count[0][0]
 
 
-def update_habit_streak(db, name, streak, time=None):
+_UPDATE_STREAK_QUERY = """UPDATE habit_tracker
+    SET streak = ?1, completion_time = ?3, longest_streak = MAX(COALESCE(longest_streak, 0), ?2)
+    WHERE user = ?5 AND habit = ?4"""
+
+
+@_writes
+def update_habit_streak(db, name, streak, time=None, commit=True):
     """
-    This function updates streak of specified habit.
+    This function updates streak of specified habit, raising its longest streak if the new streak beats it.
 
     :param db: To maintain connection with DB.
     :param name: Name of habit.
     :param streak: streak of habit
     :param time: Time when streak was updated
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
     """
     cur = db.cursor()
-    query = "UPDATE habit_tracker SET streak = ?, completion_time = ? WHERE habit = ?"
-    data = (streak, time, name)
-    cur.execute(query, data)
-    db.commit()
+    cur.execute(_UPDATE_STREAK_QUERY, (streak, streak, time, name, user_of(db)))
+    _commit(db, commit)
 
 
-def reset_logs(db, name):
+@_writes
+def update_habit_streaks(db, streaks, commit=True):
     """
-    This function resets log entries of specified habit.
+    This function updates streaks of many habits with a single statement, raising longest streaks like update_habit_streak.
+
+    :param db: To maintain connection with DB.
+    :param streaks: Iterable of (streak, longest streak, time, name) tuples; the longest streak is the highest one
+        reached since the last update, which may be above the final streak.
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
+    """
+    cur = db.cursor()
+    user = user_of(db)
+    cur.executemany(_UPDATE_STREAK_QUERY, ((*row, user) for row in streaks))
+    _commit(db, commit)
+
+
+@_writes
+def set_habit_streaks(db, streaks, commit=True):
+    """
+    This function overwrites streaks and longest streaks of many habits with a single statement,
+    e.g. with the ones rebuilt from their log, see streaks.repair.
+
+    :param db: To maintain connection with DB.
+    :param streaks: Iterable of (streak, longest streak, time, name) tuples.
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
+    """
+    cur = db.cursor()
+    user = user_of(db)
+    cur.executemany("""UPDATE habit_tracker SET streak = ?, longest_streak = ?, completion_time = ?
+                       WHERE habit = ? AND user = ?""", ((*row, user) for row in streaks))
+    _commit(db, commit)
+
+
+@_writes
+def reset_logs(db, name, commit=True):
+    """
+    This function resets log entries of specified habit, and its rollups.
 
     :param db: To maintain connection with DB.
     :param name: Name of the habit
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
     """
     cur = db.cursor()
-    query = "DELETE FROM habit_log WHERE habit = ?"
-    cur.execute(query, (name,))
-    db.commit()
+    cur.execute("DELETE FROM habit_rollup WHERE user = ? AND habit = ?", (user_of(db), name))
+    query = "DELETE FROM habit_log WHERE user = ? AND habit = ?"
+    cur.execute(query, (user_of(db), name))
+    _commit(db, commit)
+
+
+@_writes
+def purge_orphan_logs(db, commit=True):
+    """
+    This function deletes log rows and rollups of habits that no longer exist, for every user.
+    Category removal left them behind before migration 1 made habit_log cascade, and raw deletes on
+    connections without foreign keys still can; migration 7 purged the old ones once.
+
+    :param db: To maintain connection with DB.
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
+    :return: Number of deleted log rows.
+    """
+    cur = db.cursor()
+    cur.execute(_ORPHAN_ROLLUPS)
+    cur.execute(_ORPHAN_LOGS)
+    deleted = cur.rowcount
+    _commit(db, commit)
+    return deleted
+
+
+@_writes
+def rebuild_rollups(db, commit=True):
+    """
+    This function recomputes the 'habit_rollup' table from 'habit_log', for every user.
+    Triggers keep the rollups up to date, so this is only needed to repair them, e.g. after
+    changing habit_log with the triggers dropped.
+
+    :param db: To maintain connection with DB.
+    :param commit: Commit right away (default: True); never commits inside a transaction scope.
+    :return: Number of rollup rows.
+    """
+    cur = db.cursor()
+    cur.execute("DELETE FROM habit_rollup")
+    for statement in _ROLLUP_REBUILD:
+        cur.execute(statement)
+    _commit(db, commit)
+    return db.execute("SELECT COUNT(*) FROM habit_rollup").fetchone()[0]
+
+
+def rollup_period(value, grain):
+    """
+    This function names the rollup period a time falls in, the way the 'habit_rollup' table does.
+
+    :param value: date, datetime or ISO-8601 timestamp.
+    :param grain: 'day', 'week' or 'month'.
+    :return: Period such as '2024-01-05', '2024-W01' or '2024-01'.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if grain == "day":
+        return value.strftime("%Y-%m-%d")
+    if grain == "week":
+        year, week, _ = value.isocalendar()
+        return f"{year}-W{week:02d}"
+    if grain == "month":
+        return value.strftime("%Y-%m")
+    raise ValueError(f"Unknown grain '{grain}', expected one of {', '.join(ROLLUP_GRAINS)}")
 
 
 def habit_progress_time(db, name):
@@ -217,8 +998,8 @@ def habit_progress_time(db, name):
     :return: Last time progress was updated
     """
     cur = db.cursor()
-    query = "SELECT completion_time FROM habit_tracker WHERE habit = ?"
-    cur.execute(query, (name,))
+    query = "SELECT completion_time FROM habit_tracker WHERE user = ? AND habit = ?"
+    cur.execute(query, (user_of(db), name))
     data = cur.fetchall()
     return data[0][0]
 
@@ -231,8 +1012,42 @@ def fetch_habit_periodicity(db, habit_name):
     :param name: Name of habit.
     :return: Periodicity of specified habit.
     """
+    def load():
+        cur = db.cursor()
+        query = "SELECT periodicity FROM habit_tracker WHERE user = ? AND habit = ?"
+        cur.execute(query, (user_of(db), habit_name))
+        data = cur.fetchall()
+        return data[0][0]
+    return cached(db, ("periodicity", habit_name), load)
+
+
+def fetch_habit_state(db, name):
+    """
+    This function returns everything needed to update progress of a habit in a single query.
+
+    :param db: To maintain connection with DB.
+    :param name: Name of habit.
+    :return: HabitState of periodicity, streak and last completion time; None if habit does not exist.
+    """
     cur = db.cursor()
-    query = "SELECT periodicity FROM habit_tracker WHERE habit =?"
-    cur.execute(query, (habit_name,))
-    data = cur.fetchall()
-    return data[0][0]
+    query = "SELECT periodicity, streak, completion_time FROM habit_tracker WHERE user = ? AND habit = ?"
+    cur.execute(query, (user_of(db), name))
+    data = cur.fetchone()
+    return HabitState._make(data) if data is not None else None
+
+
+def fetch_habit_states(db, names=None):
+    """
+    This function returns periodicity, streak and last completion time of many habits in a single query.
+
+    :param db: To maintain connection with DB.
+    :param names: Names of habits. Empty param returns every habit.
+    :return: Dict mapping each existing habit to its HabitState.
+    """
+    cur = db.cursor()
+    query = "SELECT habit, periodicity, streak, completion_time FROM habit_tracker WHERE user = ?"
+    if names is None:
+        cur.execute(query, (user_of(db),))
+    else:
+        cur.execute(query + " AND habit IN (SELECT value FROM json_each(?))", (user_of(db), json.dumps(list(names))))
+    return {row[0]: HabitState._make(row[1:]) for row in cur}
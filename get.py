@@ -1,11 +1,68 @@
-import questionary as qt
-from db import connect_database, fetch_categories, fetch_habits
+"""
+The get module asks the user for input through questionary.
+questionary (and prompt_toolkit with it) is imported on the first prompt, through qt(), rather than at module
+load, so headless use of the other modules never pays for the UI stack.
+"""
+
+from db import get_connection, fetch_categories, fetch_habits
+
+# Up to this many entries are offered as a list; beyond it the user types with completions from DB.
+SELECT_LIMIT = 50
+
+
+def qt():
+    """
+    Function to get the questionary module, importing it on first use.
+    """
+    import questionary
+    return questionary
+
+
+def prefix_completer(db, fetch, limit=SELECT_LIMIT):
+    """
+    Function to build a completer asking DB for entries starting with the typed text,
+    so large lists are never loaded whole.
+
+    :param db: To maintain connection with DB.
+    :param fetch: fetch_habits or fetch_categories.
+    :param limit: Maximum number of completions offered at once.
+    """
+    from prompt_toolkit.completion import Completer, Completion
+
+    class PrefixCompleter(Completer):
+        def get_completions(self, document, complete_event):
+            text = document.text_before_cursor
+            for entry in fetch(db, prefix=text, limit=limit) or []:
+                yield Completion(entry, start_position=-len(text))
+
+    return PrefixCompleter()
+
+
+def choose_stored(db, fetch, select_message, type_message):
+    """
+    Function to pick a stored habit or category, by list or by typing depending on how many there are.
+
+    :param db: To maintain connection with DB.
+    :param fetch: fetch_habits or fetch_categories.
+    :return: Chosen entry in lower case; None if nothing is stored.
+    """
+    entries = fetch(db, limit=SELECT_LIMIT + 1)
+    if not entries:
+        return None
+    if len(entries) <= SELECT_LIMIT:
+        return qt().select(select_message, choices=entries).ask().lower()
+    return qt().autocomplete(
+        type_message,
+        choices=[],
+        completer=prefix_completer(db, fetch),
+        validate=lambda text: fetch(db, prefix=text, limit=1) == [text.capitalize()],
+    ).ask().lower()
 
 def habit_name():
     """
     Function to get name of habit.
     """
-    return qt.text(
+    return qt().text(
         "Enter name of Habit:",
         validate=lambda name: name.isalpha() and len(name) > 1,
     ).ask().lower()
@@ -14,7 +71,7 @@ def habit_category():
     """
     Function to get name of category.
     """
-    return qt.text(
+    return qt().text(
         "Enter name of Category:",
         validate=lambda category: category.isalpha() and len(category) > 1,
     ).ask().lower()
@@ -24,7 +81,7 @@ def habit_periodicity():
     """
     Function to get periodicity of habit.
     """
-    return qt.select(
+    return qt().select(
         "Select periodicity of Habit",
         choices=["Daily", "Weekly", "Monthly"],
     ).ask().lower()
@@ -34,18 +91,17 @@ def stored_categories():
     """
     Function to retrieve all stored categories.
     """
-    db = connect_database()
-    arr = fetch_categories(db)
-    if arr:
-        return qt.select("Select a Category", choices=sorted(arr)).ask().lower()
+    category = choose_stored(get_connection(), fetch_categories, "Select a Category", "Type a Category:")
+    if category:
+        return category
     raise ValueError("Looks empty in here; Please add a habit and its category first")
 
 def change_periodicity():
     """
     Function to confirm periodicity change.
     """
-    return qt.confirm(
-        "Modifying periodicity will reset habit streak. Do you want to continue?"
+    return qt().confirm(
+        "Modifying periodicity will recalculate habit streak from its log. Do you want to continue?"
     ).ask()
 
 
@@ -53,7 +109,7 @@ def delete_category(habit_category):
     """
     Function to confirm deletion of category.
     """
-    return qt.confirm(
+    return qt().confirm(
         f"Deleting '{habit_category.capitalize()}' will delete all associated habits. Do you want to continue?"
     ).ask()
 
@@ -62,23 +118,28 @@ def delete_habit(habit_name):
     """
     Function to confirm deletion of habit.
     """
-    return qt.confirm(f"Do you want to delete '{habit_name.capitalize()}' habit?").ask()
+    return qt().confirm(f"Do you want to delete '{habit_name.capitalize()}' habit?").ask()
+
+def more_log_entries():
+    """
+    Function to ask whether to show the next page of a habit log.
+    """
+    return qt().confirm("Show more log entries?").ask()
 
 def stored_habits():
     """
     Function to retrieve all stored habits.
     """
-    db = connect_database()
-    list_of_habits = fetch_habits(db)
-    if list_of_habits:
-        return qt.select("Please Select a Habit", choices=sorted(list_of_habits)).ask().lower()
+    habit = choose_stored(get_connection(), fetch_habits, "Please Select a Habit", "Type a Habit:")
+    if habit:
+        return habit
     raise ValueError("No habit in database; Add a habit first to use this function")
 
 def analytics_choices():
     """
     Function to display choices in analytics menu.
     """
-    return qt.select(
+    return qt().select(
         "Select an option:",
         choices=[
             "View Streaks of All Habits",
@@ -93,7 +154,7 @@ def period_choices():
     """
     Function to display period choices in display habit menu.
     """
-    return qt.select(
+    return qt().select(
         "Select an option:",
         choices=[
             "View All Habits",
@@ -1,13 +1,30 @@
 import db
+import periods
 from datetime import datetime
 
+# Outcomes of completing a habit, see Habit.progress_outcome.
+ALREADY_DONE = "already done"
+CONTINUED = "continued"
+MISSED = "missed"
+
+ALREADY_DONE_MESSAGES = {
+    "daily": "\nProgress for this habit has already been updated today. Let's do it again tomorrow!\n",
+    "weekly": "\nProgress for this habit has already been updated this week. Let's do it again next week!\n",
+    "monthly": "\nProgress for this habit has already been updated this month. Let's do it again next month!.\n",
+}
+
 
 class Habit:
     """
         Habit class to maintain habit data
     """
-    DATE_FORMAT = "%m/%d/%Y %H:%M"
-    def __init__(self, name: str = None, periodicity: str = None, category: str = None, database="main.db"):
+    DATE_FORMAT = db.TIME_FORMAT
+    # Fixed attributes keep each habit small when batches hold many of them; db is a shared connection.
+    __slots__ = ("name", "periodicity", "category", "db", "streak", "last_completion", "loaded", "quiet",
+                 "current_time")
+
+    def __init__(self, name: str = None, periodicity: str = None, category: str = None, database="main.db",
+                 quiet: bool = False, as_of=None, user: str = ""):
         """
         Parameters
         ----------
@@ -17,155 +34,282 @@ class Habit:
             The habit's frequency (daily, weekly, or monthly).
         category : str, default: None
             The category to which the habit belongs.
-        database: str, default: main.db
-            The database connection for running tests.
+        database: str or sqlite3.Connection, default: main.db
+            Name of the database to use through the connection pool, or an open connection.
+        quiet : bool, default: False
+            Suppress the messages shown to the user, e.g. for batch jobs.
+        as_of: datetime, str or callable, default: None
+            Time the habit is evaluated at: a datetime, a timestamp in DATE_FORMAT or a clock returning a datetime.
+            Empty param uses the current time.
+        user: str, default: ''
+            User the habit belongs to, when database is a name; an open connection keeps its own user.
                 """
 
         self.name = name
         self.periodicity = periodicity
         self.category = category
-        self.db = db.connect_database(database)
+        self.db = db.as_connection(database, user)
         self.streak = 0
-        self.current_time = datetime.now().strftime(self.DATE_FORMAT)
+        self.last_completion = None
+        self.loaded = False
+        self.quiet = quiet
+        if callable(as_of):
+            as_of = as_of()
+        self.current_time = db.parse_time(as_of) if as_of is not None else datetime.now()
+
+    def say(self, *message):
+        """
+        Function to show a message to the user unless the habit is quiet.
+        """
+        if not self.quiet:
+            print(*message)
 
     def add(self):
         """
         Function to update habit details to DB and update log
+
+        :return: True if the habit was added; False if it already exists.
         """
-        if not db.habit_exists(self.db, self.name):
-            db.add_habit(self.db, self.name, self.periodicity, self.category, self.current_time, self.streak)
-            db.update_log(self.db, self.name, False, 0, self.current_time)
-            print(f"\nYour Habit '{self.name.capitalize()}' as a '{self.periodicity.capitalize()}' "
-                  f"Habit in '{self.category.capitalize()}' category has been completed.\n")
-        else:
-            print("\nLooks like you already have this habit! Please choose a different one.\n")
+        now = db.format_time(self.current_time)
+        # The check runs under the write lock, so a concurrent add of the same habit cannot slip in between.
+        with db.transaction(self.db):
+            exists = db.habit_exists(self.db, self.name)
+            if not exists:
+                db.add_habit(self.db, self.name, self.periodicity, self.category, now, self.streak)
+                db.update_log(self.db, self.name, False, 0, now)
+        if not exists:
+            self.say(f"\nYour Habit '{self.name.capitalize()}' as a '{self.periodicity.capitalize()}' "
+                     f"Habit in '{self.category.capitalize()}' category has been completed.\n")
+            return True
+        self.say("\nLooks like you already have this habit! Please choose a different one.\n")
+        return False
 
     def remove(self):
         """
         Function to remove a habit from DB.
         """
         db.remove_habit(self.db, self.name)
-        print(f"\nYour habit '{self.name.capitalize()}' has been removed.\n")
+        self.say(f"\nYour habit '{self.name.capitalize()}' has been removed.\n")
 
     def change_periodicity(self):
         """
-        Function to change periodicity of a habit
+        Function to change periodicity of a habit.
+        The log is kept and the streak is recalculated from it under the new periodicity.
         """
-        db.update_periodicity(self.db, self.name, self.periodicity)
-        db.update_log(self.db, self.name, False, 0, self.current_time)
-        print(f"\nPeriodicity of habit '{self.name.capitalize()}' has been changed to '{self.periodicity.capitalize()}'\n")
+        import streaks  # streaks builds on Habit, so it is imported here rather than at module load
+
+        with db.transaction(self.db):
+            db.update_periodicity(self.db, self.name, self.periodicity)
+            db.update_log(self.db, self.name, False, 0, db.format_time(self.current_time))
+            self.streak, _, last_completion = streaks.recompute(self.db, self.name)
+        self.last_completion = db.parse_time(last_completion)
+        self.say(f"\nPeriodicity of habit '{self.name.capitalize()}' has been changed to '{self.periodicity.capitalize()}'")
+        self.say(f"Its streak, recalculated from your log, is now {self.streak}.\n")
     
     def remove_category(self):
         """
         Fuction to delete a category and its associated habits.
         """
         db.remove_category(self.db, self.category)
-        print(f"\nYour category '{self.category.capitalize()}' and its associated habits have been removed.\n")
+        self.say(f"\nYour category '{self.category.capitalize()}' and its associated habits have been removed.\n")
 
     
+    def load(self):
+        """
+        Function to load periodicity, streak and last completion of the habit from DB in one query.
+        """
+        state = db.fetch_habit_state(self.db, self.name)
+        if state is None:
+            raise ValueError(f"Habit '{self.name}' does not exist")
+        self.periodicity, self.streak, last_completion = state
+        self.last_completion = db.parse_time(last_completion)
+        self.loaded = True
+
     def reset_streak(self):
         """
         Function to reset a habit streak to 1 in the case where habit progress was not updated within defined period.
         """
         self.streak = 1
-        db.update_habit_streak(self.db, self.name, self.streak, self.current_time)
-        db.update_log(self.db, self.name, False, db.get_streak_count(self.db, self.name), self.current_time)
-        print("\nOh dear! It seems you missed your streak. Don't worry; your streak has been reset. Let's try to keep the streak going this time!")
-        print(f"Streak of babit '{self.name.capitalize()}' is now {self.streak} because you completed it.\n")
+        self.save_progress(False)
+        self.say("\nOh dear! It seems you missed your streak. Don't worry; your streak has been reset. Let's try to keep the streak going this time!")
+        self.say(f"Streak of babit '{self.name.capitalize()}' is now {self.streak} because you completed it.\n")
 
 
     def update_streak(self):
         """
         Function to increment streak by 1 and update DB.
         """
-        self.streak = db.get_streak_count(self.db, self.name)
+        if not self.loaded:
+            self.load()
         self.streak += 1
-        db.update_habit_streak(self.db, self.name, self.streak, self.current_time)
-        db.update_log(self.db, self.name, True, db.get_streak_count(self.db, self.name), self.current_time)
-        print(f"\nGreat! Your new streak for habit '{self.name.capitalize()}' is {self.streak}\n")
+        self.save_progress(True)
+        self.say(f"\nGreat! Your new streak for habit '{self.name.capitalize()}' is {self.streak}\n")
 
+    def save_progress(self, is_progressed):
+        """
+        Function to write the current streak to DB and log it, committing once.
 
-    
-   
-    def update_progress(self):
+        :param is_progressed: Indicates whether the streak was continued.
         """
-        Function to update progress on a habit. 
-        Checks if progress has been made within defined periodicity and increments or resets streak accordingly
+        now = db.format_time(self.current_time)
+        with db.transaction(self.db):
+            db.update_habit_streak(self.db, self.name, self.streak, now)
+            db.update_log(self.db, self.name, is_progressed, self.streak, now)
+        self.last_completion = self.current_time
 
+    def advance(self):
         """
-        # Daily Streak Tracker & Assignment
-        if db.fetch_habit_periodicity(self.db, self.name) == "daily":
-            if self.daily_habit_streak_verification() == 0:
-                print("\nProgress for this habit has already been updated today. Let's do it again tomorrow!\n")
-            elif self.daily_habit_streak_verification() == 1:
-                self.update_streak()
-            else:
-                self.reset_streak()
+        Function to apply a completion at current_time to the loaded streak, without touching DB.
 
-        # Weekly Streak Tracker & Assignment
-        elif db.fetch_habit_periodicity(self.db, self.name) == "weekly":
-            if self.weekly_habit_streak_verification() == 1:
-                print("\nProgress for this habit has already been updated this week. Let's do it again next week!\n")
-            elif self.weekly_habit_streak_verification() == 2:
-                self.update_streak()
-            else:
-                self.reset_streak()
+        :return: ALREADY_DONE, CONTINUED or MISSED.
+        """
+        outcome = self.progress_outcome()
+        if outcome == CONTINUED:
+            self.streak += 1
+        elif outcome == MISSED:
+            self.streak = 1
+        if outcome in (CONTINUED, MISSED):
+            self.last_completion = self.current_time
+        return outcome
 
-        # Monthly Streak Tracker & Assignment
-        elif db.fetch_habit_periodicity(self.db, self.name) == "monthly":
-            if self.monthly_habit_streak_verification() == 0:
-                print("\nProgress for this habit has already been updated this month. Let's do it again next month!.\n")
-            elif self.monthly_habit_streak_verification() == 1:
+    def progress_outcome(self):
+        """
+        Function to decide what completing the habit now means, using the loaded state only.
+        Completing it again in the period of the last completion changes nothing, completing it in the next
+        period continues the streak, and any later completion starts a new one.
+
+        :return: ALREADY_DONE, CONTINUED or MISSED; None for an unknown periodicity.
+        """
+        if self.periodicity not in periods.PERIODICITIES:
+            return None
+        elapsed = self.periods_since_completion(self.periodicity)
+        return ALREADY_DONE if elapsed <= 0 else (CONTINUED if elapsed == 1 else MISSED)
+
+    def periods_since_completion(self, periodicity):
+        """
+        Function to count the calendar periods from the last completion to current_time.
+        Uses the state read by load().
+
+        :param periodicity: 'daily', 'weekly' or 'monthly'.
+        :return: Number of periods since last completion of habit; 1 if the habit has no streak yet.
+        """
+        if self.streak == 0 or self.last_completion is None:
+            return 1
+        return periods.elapsed(self.last_completion, self.current_time, periodicity)
+
+    def update_progress(self):
+        """
+        Function to update progress on a habit. 
+        Checks if progress has been made within defined periodicity and increments or resets streak accordingly.
+        Reads the habit once and writes the result in a single transaction.
+        The transaction takes the write lock before the read, so concurrent completions of the habit
+        queue up and each one builds on the streak written by the one before.
+
+        :return: ALREADY_DONE, CONTINUED or MISSED.
+        """
+        with db.transaction(self.db):
+            self.load()
+            outcome = self.progress_outcome()
+            if outcome == ALREADY_DONE:
+                self.say(ALREADY_DONE_MESSAGES[self.periodicity])
+            elif outcome == CONTINUED:
                 self.update_streak()
-            else:
+            elif outcome == MISSED:
                 self.reset_streak()
+        return outcome
 
     def monthly_habit_streak_verification(self):
         """
         Function to update progress of monthly habits.
-        :return months: Number of month(s) since last completion of habit
+        Uses the state read by load().
+        :return months: Number of calendar month(s) since last completion of habit
         """
-        last_visit = db.habit_progress_time(self.db, self.name)
-        previous_streak = db.get_streak_count(self.db, self.name)
-        
-        if previous_streak == 0 or last_visit is None:
-            return 1
-        else:
-            current_month = self.current_time
-            month = int(current_month[:2]) - int(last_visit[:2])
-            print(month)
-            return month
+        return self.periods_since_completion("monthly")
 
     def weekly_habit_streak_verification(self):
         """
         Function to update progress of weekly habits.
-        :return week: Number of week(s) since last completion of habit
-        """
-        last_streak = db.habit_progress_time(self.db, self.name)
-        previous_streak = db.get_streak_count(self.db, self.name)
-        
-        if previous_streak == 0 or last_streak is None:
-            return 2
-        else:
-            today = self.current_time
-            delt = datetime.strptime(today[:10], "%m/%d/%Y") - datetime.strptime(last_streak[:10], "%m/%d/%Y")
-            week = 3 if (delt.days + 1) > 14 else (2 if (delt.days + 1) > 7 else 1)
-            return week
+        Uses the state read by load().
+        :return week: Number of week(s), starting on Monday, since last completion of habit
+        """
+        return self.periods_since_completion("weekly")
 
     def daily_habit_streak_verification(self):
         """
         Function to update progress of dailyg habits.
+        Uses the state read by load().
         :return date.days: Number of day(s) since last completion of habit
         """
-        last_visit = db.habit_progress_time(self.db, self.name)
-        previous_streak = db.get_streak_count(self.db, self.name)
-        
-        if previous_streak == 0 or last_visit is None:
-            return 1
-        else:
-            today = self.current_time
-            date = datetime.strptime(today[:10], "%m/%d/%Y") - datetime.strptime(last_visit[:10], "%m/%d/%Y")
-            return date.days
+        return self.periods_since_completion("daily")
 
 
+def update_progress_many(completions, database="main.db", user=""):
+    """
+    Function to record many habit completions at once.
+    Loads every affected habit in one query, works out the new streaks in memory
+    and writes all streaks and log rows in a single transaction. Each completion time is parsed once.
+
+    :param completions: Iterable of (habit name, completion time) pairs. Completion time is a datetime
+        or a string in Habit.DATE_FORMAT.
+    :param database: Name of DB to update (default: main.db), or an open connection.
+    :param user: User the habits belong to, when database is a name (default: '').
+    :return: List of (habit name, completion time, outcome) in the order they were applied, with completion
+        times in Habit.DATE_FORMAT; outcome is None for habits that do not exist.
+    """
+    by_habit = {}
+    for name, completion_time in completions:
+        # Aware times are converted to local time here, so they sort and are stored like the others.
+        moment = db.parse_time(completion_time)
+        if isinstance(completion_time, datetime):
+            completion_time = db.format_time(moment)
+        by_habit.setdefault(name, []).append((moment, completion_time))
 
+    conn = db.as_connection(database, user)
+    habit = Habit(database=conn, quiet=True)
+    results, streaks, log_entries = [], [], []
+    # Read and write under one write lock, like Habit.update_progress.
+    with db.transaction(conn):
+        states = db.fetch_habit_states(conn, by_habit)
+        for name, times in by_habit.items():
+            times.sort()
+            if name not in states:
+                results.extend((name, completion_time, None) for _, completion_time in times)
+                continue
+            habit.name = name
+            habit.periodicity, habit.streak, last_completion = states[name]
+            habit.last_completion = db.parse_time(last_completion)
+            habit.loaded = True
+            # A streak may peak and then reset within the batch, so the highest one is kept for longest_streak.
+            longest = habit.streak
+            for moment, completion_time in times:
+                habit.current_time = moment
+                outcome = habit.advance()
+                results.append((name, completion_time, outcome))
+                if outcome in (CONTINUED, MISSED):
+                    log_entries.append((name, outcome == CONTINUED, habit.streak, completion_time))
+                    last_completion = completion_time
+                    longest = max(longest, habit.streak)
+            streaks.append((habit.streak, longest, last_completion, name))
+        db.update_habit_streaks(conn, streaks)
+        db.update_logs(conn, log_entries)
+    return results
+
+
+def progress_outcomes(names=None, as_of=None, database="main.db", user=""):
+    """
+    Function to work out what completing habits at one instant would mean, without changing DB.
+    All habits are read in one query and evaluated against the same reference time.
+
+    :param names: Names of habits. Empty param evaluates every habit.
+    :param as_of: Reference time, see Habit. Empty param uses the current time.
+    :param database: Name of DB, or an open connection (default: main.db).
+    :param user: User the habits belong to, when database is a name (default: '').
+    :return: Dict mapping each existing habit to ALREADY_DONE, CONTINUED or MISSED.
+    """
+    habit = Habit(database=database, quiet=True, as_of=as_of, user=user)
+    outcomes = {}
+    for name, (periodicity, streak, last_completion) in db.fetch_habit_states(habit.db, names).items():
+        habit.name, habit.periodicity, habit.streak = name, periodicity, streak
+        habit.last_completion = db.parse_time(last_completion)
+        outcomes[name] = habit.progress_outcome()
+    return outcomes
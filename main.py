@@ -1,12 +1,9 @@
-import questionary as qt
+import sys
 from habit import Habit
 import analytics
+import cli
 import get
 
-# Greeting message
-print("*** Welcome ***")
-
-
 # CLI Interface
 def menu():
     """
@@ -23,7 +20,7 @@ def menu():
         "Exit"
     ]
 
-    choice = qt.select("Select an Option:", choices=choices).ask()
+    choice = get.qt().select("Select an Option:", choices=choices).ask()
 
     if choice == "Add/Remove Habit or Category":
         handle_add_remove()
@@ -57,7 +54,7 @@ def handle_add_remove():
         "Return to Main Menu"
     ]
 
-    second_choice = qt.select("Choose an Option:",
+    second_choice = get.qt().select("Choose an Option:",
      choices=choices).ask()
 
     if second_choice == "Add Habit":
@@ -178,7 +175,7 @@ def handle_analytics():
         except ValueError:
             print("\nLooks empty in here! Please add a habit first\n")
         else:
-            analytics.show_habit_streak_data(habit_name) if second_choice == "View Longest Streak of a Habit" else analytics.show_habit_logged_data(habit_name)
+            analytics.show_habit_streak_data(habit_name) if second_choice == "View Longest Streak of a Habit" else analytics.show_habit_logged_data(habit_name, page_size=20, more=get.more_log_entries)
 
     elif second_choice == "Return to Main Menu":
         menu()
@@ -186,5 +183,10 @@ def handle_analytics():
 
 
 if __name__ == "__main__":
+    # Any arguments run a single non-interactive command, see the cli module.
+    if len(sys.argv) > 1:
+        sys.exit(cli.main())
+    # Greeting message
+    print("*** Welcome ***")
     while True:
         menu()
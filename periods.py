@@ -0,0 +1,46 @@
+"""
+The periods module maps times to the calendar period they fall in for each periodicity.
+
+Every period has an integer index, so consecutive periods have consecutive indexes and comparing two
+times is a subtraction: days are date ordinals, weeks start on Monday like ISO weeks, and months are
+counted as year * 12 + month. No strings are parsed, which keeps streak checks cheap enough to run
+for every habit on every completion.
+"""
+
+from datetime import date
+
+PERIODICITIES = ("daily", "weekly", "monthly")
+
+# date.toordinal() of 1970-01-01, to convert epoch day numbers to ordinals.
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def period_index(moment, periodicity):
+    """
+    Function to get the index of the period a time falls in.
+
+    :param moment: date or datetime.
+    :param periodicity: 'daily', 'weekly' or 'monthly'.
+    :return: Period index.
+    """
+    if periodicity == "daily":
+        return moment.toordinal()
+    if periodicity == "weekly":
+        # Ordinal 1, 0001-01-01, was a Monday.
+        return (moment.toordinal() - 1) // 7
+    if periodicity == "monthly":
+        return moment.year * 12 + moment.month - 1
+    raise ValueError(f"Unknown periodicity '{periodicity}', expected one of {', '.join(PERIODICITIES)}")
+
+
+def elapsed(earlier, later, periodicity):
+    """
+    Function to count the period boundaries between two times, e.g. 1 from a Sunday to the next Monday
+    for weekly habits, or 1 from December 31 to January 1 for monthly ones.
+
+    :param earlier: date or datetime.
+    :param later: date or datetime.
+    :param periodicity: 'daily', 'weekly' or 'monthly'.
+    :return: Number of periods; 0 within the same period, negative if later is in an earlier period.
+    """
+    return period_index(later, periodicity) - period_index(earlier, periodicity)
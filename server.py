@@ -0,0 +1,339 @@
+"""
+The server module serves habits, completions, streaks and logs as a local JSON HTTP API, built on the standard library.
+
+    python main.py serve --port 8080
+    curl -X POST localhost:8080/habits -d '{"name": "running", "periodicity": "daily", "category": "health"}'
+    curl -X POST localhost:8080/habits/running/completions -d '{"at": "2024-01-05 07:30"}'
+    curl localhost:8080/habits/running/streak
+
+Endpoints, each taking an optional ?user= for the user whose habits to work on (default: ''):
+
+    GET  /habits[?periodicity=]                      habits
+    POST /habits                                     add a habit from {"name", "periodicity", "category"}
+    POST /habits/<name>/completions                  complete a habit now, or {"at": ISO-8601 time}
+    GET  /streaks                                    current and longest streak of every habit
+    GET  /habits/<name>/streak                       current and longest streak of a habit
+    GET  /habits/<name>/log[?start=&end=]            log of a habit
+    GET  /habits/<name>/periods[?grain=&start=&end=] completions of a habit per day, week or month
+
+Requests are served by a fixed pool of worker threads, each with its own pooled connection per database,
+shared by all users. Connections are kept alive between requests (HTTP/1.1), and a kept-alive connection holds
+its worker thread, so no more than `workers` connections are served at once. So that idle clients cannot stall
+the others, a connection gives up its worker as soon as another connection waits for one: it is answered with
+"Connection: close", or closed while idle. Otherwise it is closed once idle for KEEP_ALIVE_TIMEOUT.
+GET responses carry an ETag; a request whose If-None-Match matches gets an empty 304 Not Modified.
+"""
+
+import hashlib
+import json
+import select
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import analytics
+import db
+import periods
+from habit import Habit
+
+# Seconds an idle keep-alive connection holds on to its worker thread while no other connection waits for one.
+KEEP_ALIVE_TIMEOUT = 5
+# Seconds between checks for waiting connections while a kept-alive connection is idle.
+IDLE_POLL = 0.05
+# Largest request body accepted, in bytes.
+MAX_BODY = 64 * 1024
+
+
+class APIError(Exception):
+    """
+    Error answered with the given HTTP status and {"error": message}.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _record(record):
+    data = record._asdict()
+    if "completed" in data:
+        data["completed"] = bool(data["completed"])
+    return data
+
+
+def _existing(conn, name):
+    if not db.habit_exists(conn, name):
+        raise APIError(HTTPStatus.NOT_FOUND, f"habit '{name}' does not exist")
+
+
+def list_habits(conn, query, body):
+    periodicity = query.get("periodicity", "all")
+    if periodicity not in ("all",) + periods.PERIODICITIES:
+        raise APIError(HTTPStatus.BAD_REQUEST, f"unknown periodicity '{periodicity}'")
+    return HTTPStatus.OK, [_record(row) for row in analytics.data_of_habits(conn, periodicity)]
+
+
+def add_habit(conn, query, body):
+    name = str(body.get("name", "")).strip().lower()
+    periodicity = str(body.get("periodicity", "")).strip().lower()
+    category = str(body.get("category", "")).strip().lower()
+    if not name or not category or periodicity not in periods.PERIODICITIES:
+        raise APIError(HTTPStatus.BAD_REQUEST, "expected name, category and periodicity, one of "
+                                               + ", ".join(periods.PERIODICITIES))
+    try:
+        added = Habit(name, periodicity, category, database=conn, quiet=True).add()
+    except sqlite3.IntegrityError:
+        added = False
+    if not added:
+        raise APIError(HTTPStatus.CONFLICT, f"habit '{name}' already exists")
+    return HTTPStatus.CREATED, _record(analytics.data_of_single_habit(conn, name)[0])
+
+
+def complete_habit(conn, query, body, name):
+    at = body.get("at")
+    if at is not None and not isinstance(at, str):
+        raise APIError(HTTPStatus.BAD_REQUEST, "'at' must be an ISO-8601 time")
+    _existing(conn, name)
+    habit = Habit(name, database=conn, quiet=True, as_of=at)
+    outcome = habit.update_progress()
+    return HTTPStatus.OK, {"habit": name, "outcome": outcome, "streak": habit.streak,
+                           "time": db.format_time(habit.current_time)}
+
+
+def _streak(record, now):
+    return {"habit": record.habit, "periodicity": record.periodicity, "streak": record.streak,
+            "current_streak": analytics.current_streak(record, now), "longest_streak": record.longest_streak,
+            "completion_time": record.completion_time}
+
+
+def all_streaks(conn, query, body):
+    now = datetime.now()
+    return HTTPStatus.OK, [_streak(record, now) for record in analytics.data_of_habits(conn, "all")]
+
+
+def habit_streak(conn, query, body, name):
+    records = analytics.data_of_single_habit(conn, name)
+    if not records:
+        raise APIError(HTTPStatus.NOT_FOUND, f"habit '{name}' does not exist")
+    return HTTPStatus.OK, _streak(records[0], datetime.now())
+
+
+def habit_log(conn, query, body, name):
+    _existing(conn, name)
+    entries = analytics.iter_habit_log(conn, name, 500, query.get("start"), query.get("end"))
+    return HTTPStatus.OK, [_record(entry) for entry in entries]
+
+
+def habit_periods(conn, query, body, name):
+    _existing(conn, name)
+    rows = analytics.completions_per_period(conn, name, query.get("grain", "week"), query.get("start"),
+                                            query.get("end"))
+    return HTTPStatus.OK, [{"period": period, "completions": completions} for period, completions in rows]
+
+
+# (method, path) to handler; '*' in a path matches a habit name, which is passed to the handler.
+ROUTES = {
+    ("GET", ("habits",)): list_habits,
+    ("POST", ("habits",)): add_habit,
+    ("POST", ("habits", "*", "completions")): complete_habit,
+    ("GET", ("streaks",)): all_streaks,
+    ("GET", ("habits", "*", "streak")): habit_streak,
+    ("GET", ("habits", "*", "log")): habit_log,
+    ("GET", ("habits", "*", "periods")): habit_periods,
+}
+
+
+def route(method, parts):
+    """
+    Function to find the handler of a request.
+
+    :param method: HTTP method.
+    :param parts: Decoded path segments.
+    :return: Tuple of handler and the habit names in the path.
+    """
+    allowed = False
+    for (route_method, pattern), handler in ROUTES.items():
+        if len(pattern) != len(parts) or any(p != "*" and p != part for p, part in zip(pattern, parts)):
+            continue
+        if route_method == method:
+            return handler, [part.lower() for p, part in zip(pattern, parts) if p == "*"]
+        allowed = True
+    if allowed:
+        raise APIError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported here")
+    raise APIError(HTTPStatus.NOT_FOUND, "no such endpoint")
+
+
+class HabitRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the API requests, see the module docstring.
+    """
+    protocol_version = "HTTP/1.1"
+    server_version = "HabitTracker/1.0"
+    timeout = KEEP_ALIVE_TIMEOUT
+    # Headers and body are written separately; without TCP_NODELAY the body waits for the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    def wait_for_request(self):
+        """
+        Function to wait for the next request on a kept-alive connection, see the module docstring.
+
+        :return: True once the client has sent more data or hung up; False to close the connection.
+        """
+        # A pipelined request may already sit in the read buffer, where select cannot see it.
+        self.connection.setblocking(False)
+        try:
+            if self.rfile.peek(1):
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if select.select([self.connection], [], [], IDLE_POLL)[0]:
+                return True
+            if self.server.waiting or time.monotonic() >= deadline:
+                return False
+
+    def log_request(self, code="-", size="-"):
+        if self.server.verbose:
+            super().log_request(code, size)
+
+    def read_body(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True
+            raise APIError(HTTPStatus.BAD_REQUEST, "invalid Content-Length") from None
+        if length > MAX_BODY:
+            self.close_connection = True
+            raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+        data = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(data) if data.strip() else {}
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, "request body is not valid JSON") from None
+        if not isinstance(body, dict):
+            raise APIError(HTTPStatus.BAD_REQUEST, "request body must be a JSON object")
+        return body
+
+    def dispatch(self, method):
+        try:
+            # The body is read before anything can fail, so the next request on the connection starts clean.
+            body = self.read_body()
+            url = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            handler, names = route(method, [unquote(part) for part in url.path.strip("/").split("/")])
+            conn = self.server.connection(query.get("user", ""))
+            status, payload = handler(conn, query, body, *names)
+        except APIError as exception:
+            status, payload = exception.status, {"error": str(exception)}
+        except ValueError as exception:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": str(exception)}
+        except Exception as exception:
+            self.log_error("%s failed: %r", self.path, exception)
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+        self.send_json(status, payload, etag=method == "GET" and status == HTTPStatus.OK)
+
+    def send_json(self, status, payload, etag=False):
+        """
+        Function to send a JSON response, or 304 Not Modified if it has the ETag the client already holds.
+        """
+        body = json.dumps(payload).encode()
+        if etag:
+            tag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            if tag in (value.strip() for value in self.headers.get("If-None-Match", "").split(",")):
+                self.start_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", tag)
+                self.end_headers()
+                return
+        self.start_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", tag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_response(self, status):
+        """
+        Function to send the status line, closing the connection after the response if another connection
+        is waiting for a worker.
+        """
+        self.send_response(status)
+        if self.server.waiting:
+            self.close_connection = True
+        if self.close_connection:
+            self.send_header("Connection", "close")
+
+
+class HabitServer(HTTPServer):
+    """
+    HTTP server handing each connection to a fixed pool of worker threads.
+    """
+
+    def __init__(self, address, database="main.db", workers=8, router=None, verbose=False):
+        """
+        :param address: (host, port) to listen on; port 0 picks a free port.
+        :param database: Name of DB to serve (default: main.db).
+        :param workers: Number of worker threads, and so of connections served at the same time.
+        :param router: shards.ShardRouter to serve users from their shards instead of database.
+        :param verbose: Log every request to stderr.
+        """
+        super().__init__(address, HabitRequestHandler)
+        self.database = database
+        self.router = router
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="habit-http")
+        # Connections accepted but not yet picked up by a worker.
+        self.waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def connection(self, user):
+        """
+        Function to get the calling worker's pooled connection to a user's habits.
+        """
+        if self.router is not None:
+            return self.router.connection(user)
+        return db.get_connection(self.database, user)
+
+    def process_request(self, request, client_address):
+        with self._waiting_lock:
+            self.waiting += 1
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        with self._waiting_lock:
+            self.waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        if self.router is not None:
+            self.router.close()
+        else:
+            db.close_connections(self.database)
@@ -0,0 +1,85 @@
+"""
+The shards module spreads users over several database files, so their writes do not queue on one database lock.
+
+Users are placed on a consistent-hash ring: every shard file owns REPLICAS points on the ring and a user
+belongs to the first point at or after the hash of their name. Adding a shard only moves the users that
+land on its points, about 1/N of them, and the placement does not depend on the order of the shards.
+Shards are hashed by file name, so the directory holding them can be moved.
+
+    router = ShardRouter.from_directory("data", 8)
+    Habit("running", "daily", "health", database=router.connection("alice")).add()
+    analytics.show_habit_streak_data(database=router.connection("alice"))
+"""
+
+import bisect
+import hashlib
+import os
+
+import db
+
+# Points per shard on the ring; more points spread users more evenly.
+REPLICAS = 100
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class ShardRouter:
+    """
+    Maps users to shard database files.
+    """
+
+    def __init__(self, paths, replicas=REPLICAS):
+        """
+        :param paths: Paths of the shard DB files; files are created on first use.
+        :param replicas: Points per shard on the ring.
+        """
+        if not paths:
+            raise ValueError("A ShardRouter needs at least one shard")
+        self.paths = list(paths)
+        ring = sorted((_hash(f"{os.path.basename(path)}#{replica}"), path)
+                      for path in self.paths for replica in range(replicas))
+        self._points = [point for point, _ in ring]
+        self._shards = [path for _, path in ring]
+
+    @classmethod
+    def from_directory(cls, directory, count, prefix="shard", replicas=REPLICAS):
+        """
+        Function to build a router over count shards named shard000.db, shard001.db, ... in a directory.
+
+        :param directory: Directory holding the shards; created if needed.
+        :param count: Number of shards.
+        :param prefix: File name prefix of the shards.
+        :return: ShardRouter.
+        """
+        os.makedirs(directory, exist_ok=True)
+        return cls([os.path.join(directory, f"{prefix}{number:03d}.db") for number in range(count)], replicas)
+
+    def shard(self, user):
+        """
+        Function to find the shard of a user.
+
+        :param user: Name of user.
+        :return: Path of the user's shard DB file.
+        """
+        index = bisect.bisect_left(self._points, _hash(user))
+        return self._shards[index % len(self._shards)]
+
+    def connection(self, user):
+        """
+        Function to get the calling thread's pooled connection to a user's habits.
+        The connection can be passed to Habit, analytics and the db functions like any other; users of
+        a shard share one connection per thread, see db.get_connection.
+
+        :param user: Name of user.
+        :return: DB connection.
+        """
+        return db.get_connection(self.shard(user), user)
+
+    def close(self):
+        """
+        Function to close the pooled connections to every shard.
+        """
+        for path in self.paths:
+            db.close_connections(path)
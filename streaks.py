@@ -0,0 +1,101 @@
+"""
+The streaks module rebuilds habit streaks from the habit log, so streak counters can be recalculated
+after a periodicity change and checked or repaired across the whole database.
+"""
+
+import json
+from itertools import groupby
+
+import db
+from habit import CONTINUED, MISSED, Habit
+
+# Log rows that record a completion; rows with a zero streak mark habit creation or a periodicity change.
+COMPLETIONS_QUERY = """
+    SELECT t.habit, t.periodicity, l.completion_time
+    FROM habit_tracker t LEFT JOIN habit_log l ON l.user = t.user AND l.habit = t.habit AND l.streak > 0
+    WHERE t.user = ? {where}
+    ORDER BY t.habit, l.completion_time"""
+
+
+def replay(habit, completion_times):
+    """
+    Function to replay completions through a habit's streak rules, starting from an empty streak.
+
+    :param habit: Habit with the periodicity to evaluate against.
+    :param completion_times: Completion times in ascending order, as stored in DB.
+    :return: Tuple of current streak, longest streak and last completion time as stored in DB.
+    """
+    habit.streak, habit.last_completion, habit.loaded = 0, None, True
+    longest = 0
+    last_completion = None
+    for completion_time in completion_times:
+        habit.current_time = db.parse_time(completion_time)
+        if habit.advance() in (CONTINUED, MISSED):
+            last_completion = completion_time
+        longest = max(longest, habit.streak)
+    return habit.streak, longest, last_completion
+
+
+def compute_streaks(conn, names=None):
+    """
+    Function to compute streaks of habits from their log in a single sorted pass.
+
+    :param conn: To maintain connection with DB.
+    :param names: Names of habits to compute. Empty param computes every habit.
+    :return: Dict mapping habit name to a (streak, longest streak, last completion time) tuple.
+    """
+    cur = conn.cursor()
+    if names is None:
+        cur.execute(COMPLETIONS_QUERY.format(where=""), (db.user_of(conn),))
+    else:
+        cur.execute(COMPLETIONS_QUERY.format(where="AND t.habit IN (SELECT value FROM json_each(?))"),
+                    (db.user_of(conn), json.dumps(list(names))))
+    habit = Habit(database=conn)
+    computed = {}
+    for (name, periodicity), rows in groupby(cur, key=lambda row: row[:2]):
+        habit.name, habit.periodicity = name, periodicity
+        computed[name] = replay(habit, (row[2] for row in rows if row[2] is not None))
+    return computed
+
+
+def recompute(conn, name):
+    """
+    Function to recompute the streak and longest streak of a habit from its log and store them.
+
+    :param conn: To maintain connection with DB.
+    :param name: Name of habit.
+    :return: Tuple of current streak, longest streak and last completion time.
+    """
+    streak, longest, last_completion = compute_streaks(conn, [name])[name]
+    db.set_habit_streaks(conn, [(streak, longest, last_completion, name)])
+    return streak, longest, last_completion
+
+
+def verify(conn):
+    """
+    Function to compare the stored streak and longest streak of every habit with the ones rebuilt from its log.
+
+    :param conn: To maintain connection with DB.
+    :return: List of (name, stored streak, computed streak, computed longest streak, computed last completion time)
+        for habits that differ.
+    """
+    stored = {row[0]: row[1:] for row in conn.execute("SELECT habit, streak, longest_streak, completion_time "
+                                                      "FROM habit_tracker WHERE user = ?", (db.user_of(conn),))}
+    mismatches = []
+    for name, computed in compute_streaks(conn).items():
+        if stored[name] != computed:
+            mismatches.append((name, stored[name][0], *computed))
+    return mismatches
+
+
+def repair(conn):
+    """
+    Function to overwrite every stored streak and longest streak that differs from the one rebuilt from its log.
+
+    :param conn: To maintain connection with DB.
+    :return: Number of repaired habits.
+    """
+    mismatches = verify(conn)
+    db.set_habit_streaks(conn, [(streak, longest, last_completion, name)
+                                for name, _, streak, longest, last_completion in mismatches])
+    return len(mismatches)
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+from aiodb import AsyncDatabase
+from habit import CONTINUED
+
+
+def test_add_complete_and_read(tmp_path):
+    async def scenario():
+        async with AsyncDatabase(str(tmp_path / "test_aiodb.db")) as database:
+            assert await database.add_habit("running", "daily", "health", as_of="2024-01-01 08:00")
+            assert not await database.add_habit("running", "daily", "health")
+            assert await database.update_progress("running", as_of="2024-01-02 07:00") == CONTINUED
+            return (await database.fetch_habits(), await database.get_streak_count("running"),
+                    await database.completions_per_period("running", "day"))
+
+    habits, streak, periods = asyncio.run(scenario())
+    assert habits == ["Running"]
+    assert streak == 1
+    assert [tuple(row) for row in periods] == [("2024-01-02", 1)]
+
+
+def test_writes_run_in_order_on_one_thread(tmp_path):
+    threads = set()
+
+    def record(conn, name, day):
+        threads.add(threading.current_thread().name)
+        return name, day
+
+    async def scenario():
+        async with AsyncDatabase(str(tmp_path / "test_aiodb.db")) as database:
+            await database.add_habit("running", "daily", "health", as_of="2024-01-01 08:00")
+            await asyncio.gather(*(database.write(record, "running", day) for day in range(10)))
+            await asyncio.gather(*(database.update_progress("running", as_of=f"2024-01-{day:02d} 07:00")
+                                   for day in range(2, 12)))
+            return await database.longest_habit_streak("running")
+
+    assert asyncio.run(scenario()) == 10
+    assert len(threads) == 1
+
+
+def test_identical_reads_in_flight_are_coalesced(tmp_path):
+    calls = []
+
+    def slow(conn, name):
+        calls.append(name)
+        time.sleep(0.1)
+        return [name]
+
+    async def scenario():
+        async with AsyncDatabase(str(tmp_path / "test_aiodb.db")) as database:
+            results = await asyncio.gather(*(database.read(slow, "running") for _ in range(5)),
+                                           database.read(slow, "reading"))
+            # Finished reads are not reused.
+            await database.read(slow, "running")
+            return results
+
+    results = asyncio.run(scenario())
+    assert results == [["running"]] * 5 + [["reading"]]
+    assert sorted(calls) == ["reading", "running", "running"]
+
+
+def test_reads_after_a_write_see_it(tmp_path):
+    async def scenario():
+        async with AsyncDatabase(str(tmp_path / "test_aiodb.db")) as database:
+            before = asyncio.ensure_future(database.fetch_habits())
+            await database.add_habit("running", "daily", "health")
+            after = await database.fetch_habits()
+            await before
+            return after
+
+    assert asyncio.run(scenario()) == ["Running"]
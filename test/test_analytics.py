@@ -0,0 +1,93 @@
+import os
+from datetime import date, datetime
+
+import pytest
+
+from analytics import completions_in_period, completions_per_period, current_streak, data_of_habits, \
+    data_of_single_habit, display_time, habit_log, habit_log_pages, iter_habit_log
+from db import HabitRecord, LogEntry, add_habit, connect_database, update_logs
+from habit import Habit
+
+
+@pytest.fixture
+def db():
+    db = connect_database("test_analytics.db")
+    add_habit(db, "running", "daily", "health", "2023-12-01 08:00", 0)
+    add_habit(db, "reading", "weekly", "growth", "2023-12-01 08:00", 0)
+    update_logs(db, [("running", True, day, f"2023-12-{day:02d} 09:00") for day in range(1, 11)])
+    update_logs(db, [("reading", True, 1, "2023-12-05 09:00"), ("running", True, 11, "2023-12-05 09:00")])
+    yield db
+    db.close()
+    os.remove("test_analytics.db")
+
+
+def test_display_time():
+    assert display_time("2023-12-17 20:08") == "12/17/2023 20:08"
+    assert display_time(None) is None
+
+
+def test_habit_log_pages(db):
+    pages = list(habit_log_pages(db, "running", page_size=4))
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [row for page in pages for row in page] == habit_log(db, "running")
+
+
+def test_habit_log_pages_break_ties_on_insertion_order(db):
+    rows = list(iter_habit_log(db, "running", page_size=5))
+    assert [row[2] for row in rows[4:6]] == [5, 11]
+
+
+def test_iter_habit_log_date_range(db):
+    rows = list(iter_habit_log(db, "running", page_size=2, start=date(2023, 12, 3), end="2023-12-06"))
+    assert [row[3] for row in rows] == ["2023-12-03 09:00", "2023-12-04 09:00", "2023-12-05 09:00",
+                                        "2023-12-05 09:00"]
+
+
+def test_iter_habit_log_unknown_habit(db):
+    assert list(iter_habit_log(db, "swimming")) == []
+
+
+def test_data_of_habits_projection(db):
+    assert data_of_habits(db, "weekly", ("habit", "streak")) == [("reading", 0)]
+    assert len(data_of_habits(db, None)) == 2
+    with pytest.raises(ValueError):
+        data_of_habits(db, "all", ("habit", "1; DROP TABLE habit_log"))
+
+
+def test_completions_per_period(db):
+    assert completions_per_period(db, "running", "week") == [("2023-W48", 3), ("2023-W49", 8)]
+    assert completions_per_period(db, "running", "day", start="2023-12-09", end=date(2023, 12, 10)) == [
+        ("2023-12-09", 1), ("2023-12-10", 1)]
+    assert completions_per_period(db, "reading", "month", start="2023-12") == [("2023-12", 1)]
+    with pytest.raises(ValueError):
+        completions_per_period(db, "running", "year")
+
+
+def test_completions_in_period(db):
+    assert completions_in_period(db, "week", "2023-12-05") == [("reading", 1), ("running", 8)]
+    assert completions_in_period(db, "day", "2023-12-05 23:00") == [("reading", 1), ("running", 2)]
+
+
+def test_fetchers_return_records(db):
+    record = data_of_single_habit(db, "reading")[0]
+    assert isinstance(record, HabitRecord)
+    assert (record.habit, record.periodicity, record.longest_streak) == ("reading", "weekly", 0)
+    assert record[1] == "weekly"
+    names = data_of_habits(db, "daily", ("habit", "category"))
+    assert [(row.habit, row.category) for row in names] == [("running", "health")]
+    entry = habit_log(db, "reading")[0]
+    assert isinstance(entry, LogEntry)
+    assert (entry.streak, entry.completion_time) == (1, "2023-12-05 09:00")
+
+
+def test_records_and_habits_have_no_instance_dict(db):
+    assert not hasattr(data_of_single_habit(db, "reading")[0], "__dict__")
+    assert not hasattr(habit_log(db, "reading")[0], "__dict__")
+    assert not hasattr(Habit("reading", database=db), "__dict__")
+
+
+def test_current_streak_breaks_after_a_missed_period():
+    record = HabitRecord("reading", "weekly", "growth", "2023-12-01 08:00", 4, "2023-12-17 20:00", 4)
+    assert current_streak(record, datetime(2023, 12, 24, 23, 0)) == 4  # next week, still time to continue
+    assert current_streak(record, datetime(2023, 12, 25, 7, 0)) == 0
+    assert current_streak(record._replace(streak=0), datetime(2023, 12, 18)) == 0
@@ -0,0 +1,13 @@
+import json
+
+from benchmarks.run import BENCHMARKS, main
+
+
+def test_benchmark_suite_writes_json(tmp_path):
+    output = tmp_path / "results.json"
+    main(["--habits", "20", "--depth", "3", "--repeat", "2", "--output", str(output),
+          "--path", str(tmp_path / "bench.db")])
+    report = json.loads(output.read_text())
+    assert report["meta"]["habits"] == 20
+    assert set(report["results"]) == set(BENCHMARKS)
+    assert all(stats["repeat"] == 2 for stats in report["results"].values())
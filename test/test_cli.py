@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import db
+from cli import EXIT_FAILED, EXIT_OK, EXIT_USAGE, main
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "test_cli.db")
+    yield path
+    db.close_connections(path)
+
+
+def run(database, *argv, stdin=""):
+    return main(["--database", database, *argv], stdin=io.StringIO(stdin))
+
+
+def test_add_and_remove(database, capsys):
+    assert run(database, "add", "Running", "daily", "health") == EXIT_OK
+    assert run(database, "add", "-", stdin="reading,weekly,growth\nsaving,monthly,finance\n") == EXIT_OK
+    assert db.fetch_habits(db.get_connection(database)) == ["Reading", "Running", "Saving"]
+    assert run(database, "remove", "running", "saving") == EXIT_OK
+    assert db.fetch_habits(db.get_connection(database)) == ["Reading"]
+    assert "Removed 2 habit(s)." in capsys.readouterr().out
+
+
+def test_add_reports_failures(database, capsys):
+    assert run(database, "add", "-", stdin="running,daily,health\nrunning,daily,health\nswim,yearly,x\n") == EXIT_FAILED
+    err = capsys.readouterr().err
+    assert "habit 'running' already exists" in err
+    assert "swim,yearly,x" in err
+
+
+def test_complete_from_stdin(database, capsys):
+    run(database, "add", "running", "daily", "health")
+    stdin = "# morning runs\nrunning,2024-01-01 07:00\nrunning,2024-01-02T07:00\nrunning,2024-01-02 19:00\n"
+    assert run(database, "complete", "-", stdin=stdin) == EXIT_OK
+    assert db.get_streak_count(db.get_connection(database), "running") == 2
+    assert "Completed 2 habit(s), reset 0 missed streak(s), skipped 1 already completed." in capsys.readouterr().out
+
+
+def test_complete_unknown_habit(database, capsys):
+    assert run(database, "complete", "swimming", "--at", "2024-01-01") == EXIT_FAILED
+    assert "habit 'swimming' does not exist" in capsys.readouterr().err
+
+
+def test_import_csv_file(database, tmp_path):
+    run(database, "add", "running", "daily", "health")
+    path = tmp_path / "completions.csv"
+    path.write_text("habit,timestamp\n" + "".join(f"running,2024-01-{day:02d} 07:00\n" for day in range(1, 6)))
+    assert run(database, "import", str(path)) == EXIT_OK
+    assert db.get_streak_count(db.get_connection(database), "running") == 5
+
+
+def test_report(database, capsys):
+    run(database, "add", "running", "daily", "health")
+    assert run(database, "report", "streaks") == EXIT_OK
+    assert "Running" in capsys.readouterr().out
+    assert run(database, "report", "log", "swimming") == EXIT_FAILED
+    assert run(database, "report", "log", "running", "--start", "not a date") == EXIT_USAGE
+
+
+def test_report_periods_and_rebuild_rollups(database, capsys):
+    run(database, "add", "running", "daily", "health")
+    run(database, "complete", "-", stdin="running,2024-01-01\nrunning,2024-01-02\nrunning,2024-01-08\n")
+    assert run(database, "report", "periods", "running") == EXIT_OK
+    out = capsys.readouterr().out
+    assert "2024-W01                      2" in out
+    assert "2024-W02                      1" in out
+    assert run(database, "rebuild-rollups") == EXIT_OK
+    assert "Rebuilt 6 rollup row(s)." in capsys.readouterr().out
+
+
+def test_usage_error(database):
+    assert run(database, "frobnicate") == EXIT_USAGE
+
+
+def test_headless_modules_do_not_import_ui():
+    code = "import sys, db, habit, analytics, cli, main; print(sorted(m for m in sys.modules if m.startswith(('questionary', 'prompt_toolkit'))))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout == "[]\n"
+
+
+def test_export_and_import_tables(database, tmp_path, capsys):
+    run(database, "add", "running", "daily", "health")
+    run(database, "complete", "running", "--at", "2024-01-01")
+    path = str(tmp_path / "habits.jsonl")
+    assert run(database, "export", "habits", path) == EXIT_OK
+    target = str(tmp_path / "target.db")
+    assert run(target, "import", path, "--table", "habits") == EXIT_OK
+    assert db.get_streak_count(db.get_connection(target), "running") == 1
+    assert run(target, "import", "--table", "logs", stdin="habit,completed,streak,completion_time\nghost,1,1,\n") \
+        == EXIT_FAILED
+    assert "import rolled back" in capsys.readouterr().err
+    db.close_connections(target)
+
+
+def test_export_one_habit_and_import_bad_completions(database, tmp_path, capsys):
+    run(database, "add", "-", stdin="running,daily,health\nreading,weekly,growth\n")
+    capsys.readouterr()
+    assert run(database, "export", "habits", "--habit", "Running", "--format", "jsonl") == EXIT_OK
+    assert [json.loads(line)["habit"] for line in capsys.readouterr().out.splitlines()] == ["running"]
+    records = '{"habit": "running", "timestamp": "2024-01-01"}\n{"timestamp": "2024-01-02"}\n[1]\n'
+    assert run(database, "import", "-", "--format", "jsonl", stdin=records) == EXIT_FAILED
+    out, err = capsys.readouterr()
+    assert "Completed 1 habit(s)" in out
+    assert err.count("expected 'habit[,timestamp]'") == 2
+
+
+def test_habit_named_habit_is_no_header(database, capsys):
+    run(database, "add", "habit", "daily", "health")
+    assert run(database, "complete", "habit", "--at", "2024-01-01") == EXIT_OK
+    assert run(database, "complete", "-", stdin="habit,timestamp\nhabit,2024-01-02\n") == EXIT_OK
+    assert db.get_streak_count(db.get_connection(database), "habit") == 2
+
+
+def test_import_missing_file(database, tmp_path, capsys):
+    assert run(database, "import", str(tmp_path / "missing.csv")) == EXIT_FAILED
+    assert "cannot read" in capsys.readouterr().err
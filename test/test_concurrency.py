@@ -0,0 +1,40 @@
+import sqlite3
+import threading
+import time
+
+import db
+from benchmarks.concurrency import run
+
+
+def test_writers_and_readers_in_parallel_processes(tmp_path):
+    path = str(tmp_path / "test_concurrency.db")
+    totals = run(path, writers=3, readers=2, completions=30, habits=20)
+    assert totals["write"][0] == 90
+    assert totals["write"][2] == 0
+    assert totals["read"][2] == 0
+    conn = db.connect_database(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    for name in ("writer000", "writer001", "writer002"):
+        assert db.get_streak_count(conn, name) == 30
+        assert conn.execute("SELECT COUNT(*) FROM habit_log WHERE habit = ?", (name,)).fetchone()[0] == 30
+    conn.close()
+
+
+def test_transaction_retries_while_another_writer_holds_the_lock(tmp_path, monkeypatch):
+    path = str(tmp_path / "test_retry.db")
+    db.connect_database(path).close()
+    holder = sqlite3.connect(path, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    released = threading.Timer(0.3, holder.commit)
+    released.start()
+    # No busy timeout, so only the retries can wait for the lock.
+    waiting = sqlite3.connect(path, timeout=0, factory=db.Connection)
+    monkeypatch.setattr(db, "RETRY_DELAY", 0.05)
+    start = time.perf_counter()
+    with db.transaction(waiting):
+        db.add_habit(waiting, "running", "daily", "health", "2024-01-01 08:00", 0)
+    assert time.perf_counter() - start >= 0.2
+    assert db.habit_exists(waiting, "running")
+    released.join()
+    waiting.close()
+    holder.close()
@@ -0,0 +1,144 @@
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import dashboard
+from db import add_habit, connect_database, update_logs
+
+AS_OF = datetime(2024, 1, 10, 20, 0)  # a Wednesday
+
+
+@pytest.fixture
+def db():
+    db = connect_database("test_dashboard.db")
+    add_habit(db, "running", "daily", "health", "2024-01-01 08:00", 0)
+    add_habit(db, "reading", "weekly", "growth", "2023-12-04 08:00", 0)
+    add_habit(db, "saving", "monthly", "finance", "2023-11-15 08:00", 0)
+    # Running: Jan 1-3, then Jan 6, Jan 8-10; two completions on Jan 2 count once.
+    update_logs(db, [("running", True, streak, f"2024-01-{day:02d} 07:00")
+                     for streak, day in [(1, 1), (2, 2), (2, 2), (3, 3), (1, 6), (1, 8), (2, 9), (3, 10)]])
+    # Reading: weeks of Dec 4 and Dec 11, then Jan 1 and Jan 8.
+    update_logs(db, [("reading", True, 1, "2023-12-05 09:00"), ("reading", True, 2, "2023-12-14 09:00"),
+                     ("reading", True, 1, "2024-01-01 09:00"), ("reading", True, 2, "2024-01-08 09:00")])
+    # Saving: November and December; the creation row below carries no streak and is no completion.
+    update_logs(db, [("saving", False, 0, "2023-11-15 08:00"), ("saving", True, 1, "2023-11-30 09:00"),
+                     ("saving", True, 2, "2023-12-31 23:59")])
+    yield db
+    db.close()
+    os.remove("test_dashboard.db")
+
+
+def test_load(db):
+    log = dashboard.load(db)
+    assert log.names == ["reading", "running", "saving"]
+    assert log.periodicity.tolist() == [1, 0, 2]
+    assert len(log) == 15
+    assert int(log.completed.sum()) == 14
+
+
+def test_period_numbers_follow_the_calendar():
+    days = np.array([dashboard.epoch(value) // dashboard.DAY for value in
+                     ("2023-12-31 23:59", "2024-01-01 00:00", "2024-01-07 12:00", "2024-01-08 00:00")])
+    assert np.diff(dashboard.period_numbers(days, 0)).tolist() == [1, 6, 1]
+    assert np.diff(dashboard.period_numbers(days, 1)).tolist() == [1, 0, 1]
+    assert np.diff(dashboard.period_numbers(days, 2)).tolist() == [1, 0, 0]
+
+
+def test_completion_rates(db):
+    rates = dashboard.completion_rates(dashboard.load(db), AS_OF)
+    # reading: 4 of the 6 weeks from Dec 4 to Jan 8; running: 7 of 10 days; saving: 2 of 3 months.
+    assert rates.tolist() == pytest.approx([4 / 6, 7 / 10, 2 / 3])
+
+
+def test_streak_stats(db):
+    stats = dashboard.streak_stats(dashboard.load(db), AS_OF)
+    assert stats["longest"].tolist() == [2, 3, 2]
+    # saving was last completed in December, the month before, so its streak is still going.
+    assert stats["current"].tolist() == [2, 3, 2]
+    assert stats["distribution"].tolist() == [0, 1, 3, 2]
+    later = dashboard.streak_stats(dashboard.load(db), "2024-02-20 08:00")
+    assert later["current"].tolist() == [0, 0, 0]
+
+
+def test_weekday_adherence(db):
+    adherence = dashboard.weekday_adherence(dashboard.load(db), AS_OF)
+    # Jan 1-10 has two Mondays, Tuesdays and Wednesdays and one of every other weekday.
+    assert adherence[1].tolist() == pytest.approx([1, 1, 1, 0, 0, 1, 0])
+
+
+def test_month_adherence(db):
+    rates, first_month = dashboard.month_adherence(dashboard.load(db), months=3, as_of=AS_OF)
+    assert first_month == "2023-11"
+    assert np.isnan(rates[1, :2]).all()
+    assert rates[1, 2] == pytest.approx(7 / 10)
+    # reading was created on Monday Dec 4: four weeks start in December, two so far in January.
+    assert rates[0, 1:].tolist() == pytest.approx([2 / 4, 2 / 2])
+    assert rates[2].tolist() == pytest.approx([1, 1, 0])
+
+
+def test_rolling_completions(db):
+    counts = dashboard.rolling_completions(dashboard.load(db), window=3, days=4, as_of=AS_OF)
+    # Windows ending Jan 7, 8, 9 and 10.
+    assert counts[1].tolist() == [1, 2, 2, 3]
+
+
+def test_empty_database(tmp_path):
+    conn = connect_database(str(tmp_path / "empty.db"))
+    data = dashboard.summary(conn, AS_OF)
+    assert data["completion_rate"].shape == (0,)
+    assert data["streak_distribution"].tolist() == [0]
+    conn.close()
+
+
+def test_report_dashboard(tmp_path, capsys):
+    from cli import EXIT_OK, main
+    import db as database
+
+    path = str(tmp_path / "cli.db")
+    main(["--database", path, "add", "running", "daily", "health"])
+    main(["--database", path, "complete", "running", "--at", "2024-01-09 07:00"])
+    main(["--database", path, "complete", "running", "--at", "2024-01-10 07:00"])
+    assert main(["--database", path, "report", "dashboard", "--as-of", "2024-01-10 20:00"]) == EXIT_OK
+    out = capsys.readouterr().out
+    assert "Habits: 1 | Log rows: 3 | Completions: 2" in out
+    assert "Streaks going: 1 | Longest streak: 2" in out
+    database.close_connections(path)
+
+
+def test_period_numbers_match_period_index():
+    import periods
+
+    moments = [datetime(2023, 12, 31, 23, 59), datetime(2024, 1, 1), datetime(1969, 12, 29), datetime(2024, 2, 29)]
+    days = np.array([dashboard.epoch(moment) // dashboard.DAY for moment in moments])
+    for code, periodicity in enumerate(periods.PERIODICITIES):
+        assert dashboard.period_numbers(days, code).tolist() == [
+            periods.period_index(moment, periodicity) for moment in moments]
+
+
+def test_load_reads_one_snapshot_while_habits_are_added(db):
+    update_logs(db, [("running", True, 1, f"2023-{month:02d}-{day:02d} 07:00")
+                     for month in range(1, 13) for day in range(1, 29)] * 20)
+    stop = threading.Event()
+
+    def writer():
+        conn = connect_database("test_dashboard.db")
+        number = 0
+        while not stop.is_set():
+            add_habit(conn, f"habit{number}", "daily", "fun", "2024-01-01 08:00", 0)
+            update_logs(conn, [(f"habit{number}", True, 1, "2024-01-02 07:00")])
+            number += 1
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(15):
+            log = dashboard.load(db)
+            assert len(log.habit) == len(log.time)
+    finally:
+        stop.set()
+        thread.join()
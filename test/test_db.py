@@ -1,5 +1,15 @@
-from db import add_habit, connect_database, fetch_habits, habit_exists, remove_habit, \
-    fetch_categories, update_periodicity, fetch_habit_periodicity, update_habit_streak, get_streak_count
+import sqlite3
+import threading
+
+import pytest
+
+from analytics import longest_habit_streak
+from datetime import date, datetime, timedelta, timezone
+
+from db import MIGRATIONS, ConnectionPool, add_habit, connect_database, schema_version, transaction, update_log, fetch_habits, habit_exists, remove_habit, \
+    fetch_categories, update_periodicity, fetch_habit_periodicity, update_habit_streak, get_streak_count, update_logs, \
+    reset_logs, rebuild_rollups, rollup_period, remove_category, purge_orphan_logs, format_time, \
+    parse_time
 
 
 class TestDatabase:
@@ -23,6 +33,27 @@ class TestDatabase:
     def test_fetch_categories(self):
         assert len(fetch_categories(self.db)) == 6
 
+    def test_fetch_lists_are_sorted_and_distinct(self):
+        add_habit(self.db, "jogging", "daily", "health", "2023-12-17 20:13", 0)
+        assert fetch_categories(self.db) == ["Chores", "Finance", "Fun", "Growth", "Health", "Life"]
+        assert fetch_habits(self.db, limit=3) == ["Cleaning", "Gaming", "Jogging"]
+
+    def test_fetch_with_prefix(self):
+        add_habit(self.db, "sa_ving", "daily", "fun", "2023-12-17 20:13", 0)
+        assert fetch_habits(self.db, prefix="S") == ["Sa_ving", "Saving", "Socialize"]
+        assert fetch_habits(self.db, prefix="sa_") == ["Sa_ving"]
+        assert fetch_habits(self.db, prefix="x") is None
+        assert fetch_categories(self.db, prefix="f", limit=1) == ["Finance"]
+
+    def test_prefix_lookups_search_the_index_uncached(self):
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        assert fetch_habits(self.db, prefix="So") == ["Socialize"]
+        self.db.set_trace_callback(None)
+        plan = self.db.execute("EXPLAIN QUERY PLAN " + statements[-1]).fetchall()
+        assert "habit>? AND habit<?" in plan[0][3]
+        assert self.db.cache == {}
+
     def test_remove_habit(self):
         remove_habit(self.db, "gaming")
         assert habit_exists(self.db, "gaming") is False
@@ -36,7 +67,206 @@ class TestDatabase:
         update_habit_streak(self.db, "running", 1, "12/18/2023 15:00")
         assert get_streak_count(self.db, "running") == 1
 
+    def test_update_habit_streak_keeps_longest(self):
+        update_habit_streak(self.db, "running", 3, "2023-12-18 15:00")
+        update_habit_streak(self.db, "running", 1, "2023-12-21 15:00")
+        assert longest_habit_streak(self.db, "running") == 3
+
+    def test_fetch_habits_served_from_cache(self):
+        fetch_habits(self.db)
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        assert len(fetch_habits(self.db)) == 6
+        self.db.set_trace_callback(None)
+        assert statements == ["PRAGMA data_version"]
+
+    def test_cache_invalidated_by_writes(self):
+        assert len(fetch_categories(self.db)) == 6
+        add_habit(self.db, "writing", "daily", "creativity", "2023-12-17 20:13", 0)
+        assert len(fetch_categories(self.db)) == 7
+        update_periodicity(self.db, "writing", "weekly")
+        assert fetch_habit_periodicity(self.db, "writing") == "weekly"
+        remove_habit(self.db, "writing")
+        assert "Writing" not in fetch_habits(self.db)
+
+    def test_cache_sees_other_connections(self):
+        assert len(fetch_habits(self.db)) == 6
+        other = connect_database("test_db.db")
+        add_habit(other, "writing", "daily", "creativity", "2023-12-17 20:13", 0)
+        other.close()
+        assert len(fetch_habits(self.db)) == 7
+
+    def test_transaction_commits_once(self):
+        other = connect_database("test_db.db")
+        with transaction(self.db):
+            add_habit(self.db, "writing", "daily", "growth", "12/17/2023 20:13", 0)
+            update_log(self.db, "writing", False, 0, "12/17/2023 20:13")
+            assert habit_exists(other, "writing") is False
+        assert habit_exists(other, "writing") is True
+        other.close()
+
+    def test_transaction_rolls_back_on_error(self):
+        with pytest.raises(sqlite3.IntegrityError):
+            with transaction(self.db):
+                remove_habit(self.db, "gaming")
+                add_habit(self.db, "running", "daily", "health", "12/17/2023 20:13", 0)
+        assert habit_exists(self.db, "gaming") is True
+
+    def test_remove_habit_cascades_to_log(self):
+        update_log(self.db, "gaming", True, 1, "12/18/2023 15:00")
+        self.db.execute("DELETE FROM habit_tracker WHERE habit = 'gaming'")
+        assert self.db.execute("SELECT COUNT(*) FROM habit_log WHERE habit = 'gaming'").fetchone()[0] == 0
+
+    def rollups(self, habit, grain):
+        return self.db.execute("SELECT period, completions FROM habit_rollup WHERE habit = ? AND grain = ? "
+                               "ORDER BY period", (habit, grain)).fetchall()
+
+    def test_rollups_follow_log(self):
+        update_logs(self.db, [("gaming", False, 0, "2023-12-31 08:00"), ("gaming", True, 1, "2023-12-31 09:00"),
+                              ("gaming", True, 2, "2024-01-01 09:00"), ("gaming", True, 2, "2024-01-01 21:00")])
+        assert self.rollups("gaming", "day") == [("2023-12-31", 1), ("2024-01-01", 2)]
+        assert self.rollups("gaming", "week") == [("2023-W52", 1), ("2024-W01", 2)]
+        assert self.rollups("gaming", "month") == [("2023-12", 1), ("2024-01", 2)]
+        self.db.execute("DELETE FROM habit_log WHERE completion_time = '2024-01-01 21:00'")
+        assert self.rollups("gaming", "week") == [("2023-W52", 1), ("2024-W01", 1)]
+        reset_logs(self.db, "gaming")
+        assert self.rollups("gaming", "day") == []
+
+    def test_rollup_weeks_match_iso_calendar(self):
+        days = [date(2020, 12, 20) + timedelta(days=i) for i in range(0, 2000, 3)]
+        update_logs(self.db, [("gaming", True, 1, f"{day.isoformat()} 12:00") for day in days])
+        assert [period for period, _ in self.rollups("gaming", "week")] == sorted(
+            {rollup_period(day, "week") for day in days})
+
+    def test_rebuild_rollups(self):
+        update_logs(self.db, [("gaming", True, 1, "2024-01-01 09:00"), ("running", True, 1, "2024-01-02 09:00")])
+        self.db.execute("UPDATE habit_rollup SET completions = 7")
+        assert rebuild_rollups(self.db) == 6
+        assert self.rollups("gaming", "month") == [("2024-01", 1)]
+
+    def log_count(self, *habits):
+        return self.db.execute(f"SELECT COUNT(*) FROM habit_log WHERE habit IN ({', '.join('?' * len(habits))})",
+                               habits).fetchone()[0]
+
+    def test_remove_category_removes_logs_and_rollups(self):
+        add_habit(self.db, "chess", "daily", "fun", "2023-12-17 20:13", 0)
+        update_logs(self.db, [("gaming", True, 1, "2024-01-01 09:00"), ("chess", True, 1, "2024-01-01 10:00"),
+                              ("running", True, 1, "2024-01-01 07:00")])
+        remove_category(self.db, "fun")
+        assert not habit_exists(self.db, "gaming") and not habit_exists(self.db, "chess")
+        assert self.log_count("gaming", "chess") == 0
+        assert self.rollups("gaming", "day") == self.rollups("chess", "day") == []
+        assert self.log_count("running") == 1
+        assert self.rollups("running", "day") == [("2024-01-01", 1)]
+
+    def test_remove_names_with_quotes(self):
+        add_habit(self.db, "o'clock walk", "daily", "kid's", "2023-12-17 20:13", 0)
+        add_habit(self.db, "tea", "daily", "kid's", "2023-12-17 20:13", 0)
+        remove_habit(self.db, "o'clock walk")
+        assert not habit_exists(self.db, "o'clock walk")
+        remove_category(self.db, "kid's")
+        assert not habit_exists(self.db, "tea")
+        assert len(fetch_habits(self.db)) == 6
+
+    def test_purge_orphan_logs(self):
+        update_logs(self.db, [("gaming", True, 1, "2024-01-01 09:00"), ("running", True, 1, "2024-01-01 07:00")])
+        self.db.execute("PRAGMA foreign_keys = OFF")
+        self.db.execute("DELETE FROM habit_tracker WHERE habit = 'gaming'")
+        self.db.commit()
+        assert purge_orphan_logs(self.db) == 1
+        assert self.log_count("gaming") == 0
+        assert self.rollups("gaming", "day") == []
+        assert self.log_count("running") == 1
+
+    def test_migration_purges_orphan_logs(self):
+        update_log(self.db, "gaming", True, 1, "2024-01-01 09:00")
+        self.db.execute("PRAGMA foreign_keys = OFF")
+        self.db.execute("DELETE FROM habit_tracker WHERE habit = 'gaming'")
+        self.db.execute(f"PRAGMA user_version = {len(MIGRATIONS) - 1}")
+        self.db.commit()
+        self.db.close()
+        self.db = connect_database("test_db.db")
+        assert schema_version(self.db) == len(MIGRATIONS)
+        assert self.log_count("gaming") == 0
+        assert self.rollups("gaming", "week") == []
+
     def teardown_method(self):
         self.db.close()
         import os
         os.remove("test_db.db")
+
+
+def test_format_time():
+    assert format_time(datetime(2024, 1, 1, 8, 0, 59, 500)) == "2024-01-01 08:00"
+
+
+def test_parse_time_converts_to_local_time():
+    aware = datetime(2024, 1, 1, 8, 0, tzinfo=timezone(timedelta(hours=-5)))
+    local = aware.astimezone().replace(tzinfo=None)
+    assert parse_time("2024-01-01T08:00-05:00") == parse_time(aware) == local
+    assert parse_time("2024-01-01 08:00") == datetime(2024, 1, 1, 8, 0)
+
+
+def test_migrates_legacy_database():
+    legacy = sqlite3.connect("test_legacy.db")
+    legacy.execute("CREATE TABLE habit_tracker (habit TEXT PRIMARY KEY, periodicity TEXT, category TEXT, "
+                   "creation_time TEXT, streak INT, completion_time TEXT)")
+    legacy.execute("CREATE TABLE habit_log (habit TEXT, completed BOOL, streak INT DEFAULT 0, completion_time TIME, "
+                   "FOREIGN KEY (habit) REFERENCES habit_tracker(habit))")
+    legacy.execute("INSERT INTO habit_tracker VALUES ('running', 'daily', 'health', '12/17/2023 20:08', 1, "
+                   "'12/17/2023 20:13')")
+    legacy.executemany("INSERT INTO habit_log VALUES (?, ?, ?, ?)",
+                       [("running", False, 0, "12/17/2023 20:08"), ("running", True, 1, "12/17/2023 20:13")])
+    legacy.commit()
+    legacy.close()
+
+    db = connect_database("test_legacy.db")
+    assert schema_version(db) == len(MIGRATIONS)
+    assert db.execute("SELECT id, streak, completion_time FROM habit_log ORDER BY id").fetchall() == [
+        (1, 0, "2023-12-17 20:08"), (2, 1, "2023-12-17 20:13")]
+    assert db.execute("SELECT creation_time, completion_time FROM habit_tracker").fetchone() == (
+        "2023-12-17 20:08", "2023-12-17 20:13")
+    assert longest_habit_streak(db, "running") == 1
+    assert db.execute("SELECT DISTINCT user FROM habit_log").fetchall() == [("",)]
+    plan = db.execute("EXPLAIN QUERY PLAN SELECT MAX(streak) FROM habit_log WHERE user = '' AND habit = ?",
+                      ("running",)).fetchall()
+    assert "habit_log_habit_time" in plan[0][3]
+    db.close()
+    import os
+    os.remove("test_legacy.db")
+
+
+class TestConnectionPool:
+    """
+    TestConnectionPool class contains methods that test the shared connection pool of db module
+    """
+
+    def setup_method(self):
+        self.pool = ConnectionPool()
+
+    def test_reuses_connection_per_thread(self):
+        assert self.pool.get("test_pool.db") is self.pool.get("test_pool.db")
+
+    def test_connection_per_thread(self):
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(self.pool.get("test_pool.db")))
+        thread.start()
+        thread.join()
+        assert connections[0] is not self.pool.get("test_pool.db")
+
+    def test_reopens_closed_connection(self):
+        db = self.pool.get("test_pool.db")
+        db.close()
+        assert self.pool.get("test_pool.db") is not db
+        assert fetch_habits(self.pool.get("test_pool.db")) is None
+
+    def test_context_manager_closes_connections(self):
+        with self.pool as pool:
+            db = pool.get("test_pool.db")
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.cursor()
+
+    def teardown_method(self):
+        self.pool.close()
+        import os
+        os.remove("test_pool.db")
@@ -1,6 +1,8 @@
 import pytest
-from habit import Habit
-from db import add_habit, connect_database, fetch_habits, habit_exists, remove_habit, \
+from datetime import datetime, timedelta, timezone
+
+from habit import ALREADY_DONE, CONTINUED, MISSED, Habit, progress_outcomes, update_progress_many
+from db import add_habit, close_connections, connect_database, fetch_habits, habit_exists, remove_habit, \
     fetch_categories, fetch_habit_periodicity, update_habit_streak, get_streak_count, remove_category
 from freezegun import freeze_time
 
@@ -14,6 +16,7 @@ def db():
     print('-----TEARDOWN-----')
     print("\nConnection with test DB closed.\n")
     db.close()
+    close_connections("test_habit.db")
     import os
     os.remove("test_habit.db")
     print("\nRemoved temporary DB file for testing.")
@@ -62,6 +65,11 @@ def test_add_custom_habits(db):
     assert habit_exists(db, "cycling")
 
 
+def test_timestamps_stored_as_iso(db):
+    query = "SELECT creation_time FROM habit_tracker WHERE habit = ?"
+    assert db.execute(query, ("cycling",)).fetchone()[0] == "2023-12-17 00:00"
+
+
 @freeze_time("2023-12-17")
 def test_mark_habit4_as_completed(db):
     habit4 = Habit("cycling", "weekly", "health", database="test_habit.db")
@@ -107,6 +115,19 @@ def test_mark_habit5_as_completed_next_week(db):
     assert get_streak_count(db, "party") == 2
 
 
+@freeze_time("2023-12-17")
+def test_update_progress_reads_habit_once(db):
+    habit7 = Habit("journal", "daily", "growth", database="test_habit.db")
+    habit7.add()
+    statements = []
+    habit7.db.set_trace_callback(statements.append)
+    habit7.update_progress()
+    habit7.db.set_trace_callback(None)
+    assert [s for s in statements if s.startswith("SELECT")] == [
+        "SELECT periodicity, streak, completion_time FROM habit_tracker WHERE user = '' AND habit = 'journal'"]
+    assert get_streak_count(db, "journal") == 1
+
+
 @freeze_time("2023-12-17")
 def test_mark_habit6_as_completed(db):
     habit6 = Habit("dishes", "daily", "chores", database="test_habit.db")
@@ -128,3 +149,77 @@ def test_mark_habit6_as_completed_month_later(db):
     habit6 = Habit("dishes", "daily", "chores", database="test_habit.db")
     habit6.update_progress()
     assert get_streak_count(db, "dishes") == 2
+
+
+@freeze_time("2024-02-01")
+def test_update_progress_many(db):
+    Habit("yoga", "daily", "health", database="test_habit.db").add()
+    Habit("budget", "monthly", "finance", database="test_habit.db").add()
+    results = update_progress_many([
+        ("yoga", datetime(2024, 2, 2, 7, 0)),
+        ("budget", "2024-02-03 09:00"),
+        ("yoga", "2024-02-01 07:00"),
+        ("yoga", "2024-02-02 19:00"),
+        ("yoga", "2024-02-05 07:00"),
+        ("unknown", "2024-02-05 07:00"),
+    ], database="test_habit.db")
+    assert [outcome for name, _, outcome in results if name == "yoga"] == [CONTINUED, CONTINUED, ALREADY_DONE, MISSED]
+    assert ("unknown", "2024-02-05 07:00", None) in results
+    assert get_streak_count(db, "yoga") == 1
+    assert get_streak_count(db, "budget") == 1
+    query = "SELECT COUNT(*) FROM habit_log WHERE habit = 'yoga' AND streak > 0"
+    assert db.execute(query).fetchone()[0] == 3
+
+
+def test_update_progress_many_keeps_peak_streak(db):
+    Habit("walking", "daily", "health", database="test_habit.db", as_of="2024-01-01 06:00").add()
+    results = update_progress_many([("walking", f"2024-01-{day:02d} 07:00") for day in (1, 2, 3, 10)],
+                                   database="test_habit.db")
+    assert [outcome for _, _, outcome in results] == [CONTINUED, CONTINUED, CONTINUED, MISSED]
+    query = "SELECT streak, longest_streak FROM habit_tracker WHERE habit = 'walking'"
+    assert db.execute(query).fetchone() == (1, 3)
+
+
+def test_update_progress_many_mixes_time_zones(db):
+    Habit("swimming", "daily", "health", database="test_habit.db", as_of="2024-01-01 06:00").add()
+    aware = datetime(2024, 1, 2, 7, 0, tzinfo=timezone(timedelta(hours=-5)))
+    results = update_progress_many([("swimming", aware), ("swimming", "2024-01-01 07:00")], database="test_habit.db")
+    local = aware.astimezone().replace(tzinfo=None).strftime(Habit.DATE_FORMAT)
+    assert [completion_time for _, completion_time, _ in results] == ["2024-01-01 07:00", local]
+
+
+def test_as_of_backfills_without_freezing_time(db):
+    Habit("stretching", "daily", "health", database="test_habit.db", as_of="2022-03-01 07:00").add()
+    for day, expected in [(1, 1), (2, 2), (2, 2), (5, 1)]:
+        Habit("stretching", database="test_habit.db", quiet=True, as_of=datetime(2022, 3, day, 8, 0)).update_progress()
+        assert get_streak_count(db, "stretching") == expected
+    query = "SELECT creation_time, completion_time FROM habit_tracker WHERE habit = 'stretching'"
+    assert db.execute(query).fetchone() == ("2022-03-01 07:00", "2022-03-05 08:00")
+
+
+def test_as_of_clock(db):
+    habit = Habit("stretching", database="test_habit.db", as_of=lambda: datetime(2022, 3, 6, 9, 30))
+    assert habit.current_time == datetime(2022, 3, 6, 9, 30)
+
+
+def test_progress_outcomes(db):
+    outcomes = progress_outcomes(["stretching", "unknown"], as_of="2022-03-06 09:30", database="test_habit.db")
+    assert outcomes == {"stretching": CONTINUED}
+    assert progress_outcomes(["stretching"], as_of="2022-03-05 22:00", database=db) == {"stretching": ALREADY_DONE}
+    assert progress_outcomes(database="test_habit.db", as_of="2022-03-09 09:30")["stretching"] == MISSED
+
+
+@pytest.mark.parametrize("periodicity, last, now, outcome", [
+    ("weekly", "2023-12-17 20:00", "2023-12-18 07:00", CONTINUED),  # Sunday to Monday
+    ("weekly", "2023-12-11 07:00", "2023-12-17 20:00", ALREADY_DONE),  # Monday to Sunday
+    ("weekly", "2023-12-17 20:00", "2023-12-25 07:00", MISSED),
+    ("monthly", "2023-12-31 23:00", "2024-01-01 07:00", CONTINUED),
+    ("monthly", "2023-01-15 07:00", "2024-01-15 07:00", MISSED),  # same month, next year
+    ("monthly", "2023-12-01 07:00", "2023-12-31 07:00", ALREADY_DONE),
+    ("daily", "2023-12-31 23:59", "2024-01-01 00:00", CONTINUED),
+    ("daily", "2024-02-28 07:00", "2024-03-01 07:00", MISSED),
+])
+def test_progress_outcome_follows_calendar(periodicity, last, now, outcome):
+    habit = Habit("any", periodicity, database=":memory:", as_of=now)
+    habit.streak, habit.last_completion = 1, datetime.fromisoformat(last)
+    assert habit.progress_outcome() == outcome
@@ -0,0 +1,129 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+from benchmarks.http_load import run
+from server import HabitServer
+
+
+@pytest.fixture
+def client(tmp_path):
+    httpd = HabitServer(("127.0.0.1", 0), str(tmp_path / "test_server.db"), workers=2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1])
+    yield conn
+    conn.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(conn, method, path, body=None, headers=None):
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers or {})
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, json.loads(data) if data else None, response.getheader("ETag")
+
+
+def test_add_and_complete(client):
+    habit = {"name": "Running", "periodicity": "daily", "category": "health"}
+    status, data, _ = request(client, "POST", "/habits", habit)
+    assert status == 201 and data["habit"] == "running"
+    assert request(client, "POST", "/habits", habit)[0] == 409
+    assert request(client, "POST", "/habits", {"name": "reading", "periodicity": "yearly"})[0] == 400
+    status, data, _ = request(client, "POST", "/habits/running/completions", {"at": "2100-01-01 07:00"})
+    assert (status, data["outcome"], data["streak"]) == (200, "continued", 1)
+    assert request(client, "POST", "/habits/swimming/completions")[0] == 404
+    status, data, _ = request(client, "GET", "/habits/running/log")
+    assert [(entry["completed"], entry["streak"]) for entry in data] == [(False, 0), (True, 1)]
+
+
+def test_streaks_are_revalidated_with_etags(client):
+    request(client, "POST", "/habits", {"name": "running", "periodicity": "daily", "category": "health"})
+    status, data, etag = request(client, "GET", "/habits/running/streak")
+    assert (status, data["streak"], data["longest_streak"]) == (200, 0, 0)
+    assert request(client, "GET", "/habits/running/streak", headers={"If-None-Match": etag}) == (304, None, etag)
+    request(client, "POST", "/habits/running/completions")
+    status, data, changed = request(client, "GET", "/habits/running/streak", headers={"If-None-Match": etag})
+    assert (status, data["streak"]) == (200, 1)
+    assert changed != etag
+    status, data, _ = request(client, "GET", "/streaks")
+    assert [(row["habit"], row["current_streak"]) for row in data] == [("running", 1)]
+
+
+def test_errors_keep_the_connection(client):
+    assert request(client, "GET", "/nowhere")[0] == 404
+    assert request(client, "GET", "/habits/running/completions")[0] == 405
+    client.request("POST", "/habits", "not json")
+    response = client.getresponse()
+    assert (response.status, json.loads(response.read())) == (400, {"error": "request body is not valid JSON"})
+    sock = client.sock
+    assert request(client, "GET", "/habits")[:2] == (200, [])
+    assert client.sock is sock
+
+
+def test_users_are_kept_apart(client):
+    request(client, "POST", "/habits?user=alice", {"name": "running", "periodicity": "daily", "category": "health"})
+    assert len(request(client, "GET", "/habits?user=alice")[1]) == 1
+    assert request(client, "GET", "/habits?user=bob")[1] == []
+    assert request(client, "GET", "/habits/running/streak?user=bob")[0] == 404
+
+
+def test_idle_connection_gives_its_worker_to_a_waiting_one(tmp_path):
+    httpd = HabitServer(("127.0.0.1", 0), str(tmp_path / "test_idle.db"), workers=1)
+    serving = threading.Thread(target=httpd.serve_forever, daemon=True)
+    serving.start()
+    idle, waiting = (http.client.HTTPConnection("127.0.0.1", httpd.server_address[1]) for _ in range(2))
+    assert request(idle, "GET", "/habits")[0] == 200
+    start = time.perf_counter()
+    assert request(waiting, "GET", "/habits")[0] == 200
+    assert time.perf_counter() - start < 1
+    idle.close()
+    waiting.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_http_load(tmp_path):
+    stats = run(str(tmp_path / "test_http_load.db"), clients=3, requests=30, habits=10, depth=3, workers=2)
+    assert stats["requests"] == 90
+    assert set(stats["statuses"]) <= {200, 304}
+    assert stats["p99"] >= stats["p50"] > 0
+
+
+def test_concurrent_requests_do_not_lose_updates(tmp_path):
+    httpd = HabitServer(("127.0.0.1", 0), str(tmp_path / "test_concurrent.db"), workers=8)
+    serving = threading.Thread(target=httpd.serve_forever, daemon=True)
+    serving.start()
+    names = [f"habit{number}" for number in range(20)]
+    added, outcomes = [], []
+
+    def worker(action):
+        conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1])
+        for name in names:
+            if action == "add":
+                body = {"name": name, "periodicity": "daily", "category": "health"}
+                added.append(request(conn, "POST", "/habits", body)[0])
+            else:
+                body = {"at": "2100-01-01 07:00"}
+                outcomes.append(request(conn, "POST", f"/habits/{name}/completions", body)[1]["outcome"])
+        conn.close()
+
+    for action in ("add", "complete"):
+        threads = [threading.Thread(target=worker, args=(action,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1])
+    logs = [request(conn, "GET", f"/habits/{name}/log")[1] for name in names]
+    conn.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+    assert added.count(201) == 20 and set(added) == {201, 409}
+    assert outcomes.count("continued") == 20 and outcomes.count("already done") == 140
+    assert all(sum(entry["completed"] for entry in log) == 1 for log in logs)
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+import analytics
+import db
+from cli import EXIT_OK, main
+from habit import CONTINUED, Habit
+from shards import ShardRouter
+
+USERS = [f"user{number}" for number in range(2000)]
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "test_shards.db")
+    yield path
+    db.close_connections(path)
+
+
+def test_users_spread_over_shards(tmp_path):
+    router = ShardRouter.from_directory(str(tmp_path), 4)
+    counts = {path: 0 for path in router.paths}
+    for user in USERS:
+        counts[router.shard(user)] += 1
+    assert all(count > len(USERS) / 4 * 0.7 for count in counts.values())
+    # Placement depends on the shard names only, not on their order or directory.
+    assert ShardRouter(router.paths[::-1]).shard("alice") == router.shard("alice")
+
+
+def test_adding_a_shard_only_moves_users_to_it(tmp_path):
+    before = ShardRouter.from_directory(str(tmp_path), 4)
+    after = ShardRouter.from_directory(str(tmp_path), 5)
+    moved = [user for user in USERS if before.shard(user) != after.shard(user)]
+    assert all(after.shard(user) == after.paths[4] for user in moved)
+    assert 0 < len(moved) < len(USERS) / 5 * 1.5
+
+
+def test_users_of_one_database_are_kept_apart(database):
+    alice, bob = db.get_connection(database, "alice"), db.get_connection(database, "bob")
+    Habit("running", "daily", "health", database=alice, quiet=True, as_of="2024-01-01 08:00").add()
+    Habit("running", "weekly", "fitness", database=bob, quiet=True, as_of="2024-01-01 08:00").add()
+    assert Habit("running", database=alice, quiet=True, as_of="2024-01-02 07:00").update_progress() == CONTINUED
+    assert db.get_streak_count(alice, "running") == 1
+    assert db.get_streak_count(bob, "running") == 0
+    assert [row.periodicity for row in analytics.data_of_habits(bob, "all")] == ["weekly"]
+    assert analytics.completions_per_period(alice, "running", "day") == [("2024-01-02", 1)]
+    assert analytics.completions_per_period(bob, "running", "day") == []
+    assert db.fetch_categories(db.get_connection(database)) == []
+
+    db.remove_habit(alice, "running")
+    assert not db.habit_exists(alice, "running")
+    assert db.habit_exists(bob, "running")
+    assert len(analytics.habit_log(bob, "running")) == 1
+
+
+def test_users_share_one_pooled_connection(database):
+    connections = [db.get_connection(database, user) for user in USERS]
+    assert {id(db.base_connection(conn)) for conn in connections} == {id(db.get_connection(database))}
+    Habit("running", "daily", "health", database=connections[0], quiet=True).add()
+    # Cached lookups are kept per user.
+    assert db.fetch_habits(connections[0]) == ["Running"]
+    assert db.fetch_habits(connections[1]) is None
+    with db.transaction(connections[0]):
+        assert db.in_transaction(connections[1])
+
+
+def test_cli_with_shards(tmp_path, capsys):
+    directory = str(tmp_path / "shards")
+    for user in ("alice", "bob"):
+        assert main(["--database", directory, "--shards", "3", "--user", user, "add", "running", "daily", "health"],
+                    stdin=io.StringIO()) == EXIT_OK
+    main(["--database", directory, "--shards", "3", "--user", "alice", "complete", "running", "--at", "2024-01-02"],
+         stdin=io.StringIO())
+    router = ShardRouter.from_directory(directory, 3)
+    assert db.get_streak_count(router.connection("alice"), "running") == 1
+    assert db.get_streak_count(router.connection("bob"), "running") == 0
+    assert main(["--database", directory, "--shards", "3", "rebuild-rollups"], stdin=io.StringIO()) == EXIT_OK
+    assert "Rebuilt 3 rollup row(s)." in capsys.readouterr().out
+    router.close()
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from db import add_habit, connect_database, fetch_habit_state, update_habit_streak, update_logs
+from habit import Habit
+from streaks import compute_streaks, recompute, repair, verify
+
+
+@pytest.fixture
+def db():
+    db = connect_database("test_streaks.db")
+    add_habit(db, "running", "daily", "health", "2023-12-01 08:00", 0)
+    add_habit(db, "reading", "weekly", "growth", "2023-12-01 08:00", 0)
+    update_logs(db, [
+        ("running", False, 0, "2023-12-01 08:00"),
+        ("running", True, 1, "2023-12-01 09:00"),
+        ("running", True, 2, "2023-12-02 09:00"),
+        ("running", True, 3, "2023-12-03 09:00"),
+        ("running", True, 1, "2023-12-10 09:00"),
+        ("running", True, 2, "2023-12-11 09:00"),
+    ])
+    update_habit_streak(db, "running", 3, "2023-12-03 09:00")
+    update_habit_streak(db, "running", 2, "2023-12-11 09:00")
+    yield db
+    db.close()
+    os.remove("test_streaks.db")
+
+
+def test_compute_streaks(db):
+    assert compute_streaks(db) == {
+        "reading": (0, 0, None),
+        "running": (2, 3, "2023-12-11 09:00"),
+    }
+
+
+def test_verify_finds_nothing_when_counters_match(db):
+    assert verify(db) == []
+
+
+def test_repair(db):
+    update_habit_streak(db, "running", 7, "2023-12-11 09:00")
+    assert verify(db) == [("running", 7, 2, 3, "2023-12-11 09:00")]
+    assert repair(db) == 1
+    assert verify(db) == []
+    assert db.execute("SELECT longest_streak FROM habit_tracker WHERE habit = 'running'").fetchone()[0] == 3
+
+
+def test_recompute_under_new_periodicity(db):
+    db.execute("UPDATE habit_tracker SET periodicity = 'weekly' WHERE habit = 'running'")
+    # Weeks start on Monday: Dec 1-3, Dec 10 and Dec 11 fall in three consecutive weeks.
+    assert recompute(db, "running") == (3, 3, "2023-12-11 09:00")
+    assert fetch_habit_state(db, "running") == ("weekly", 3, "2023-12-11 09:00")
+
+
+def test_recompute_lowers_longest_streak(db):
+    update_habit_streak(db, "running", 9, "2023-12-11 09:00")
+    assert recompute(db, "running") == (2, 3, "2023-12-11 09:00")
+    assert db.execute("SELECT longest_streak FROM habit_tracker WHERE habit = 'running'").fetchone()[0] == 3
+
+
+def test_change_periodicity_keeps_log(db):
+    Habit("running", "weekly", database=db).change_periodicity()
+    assert db.execute("SELECT COUNT(*) FROM habit_log WHERE habit = 'running'").fetchone()[0] == 7
+    assert fetch_habit_state(db, "running")[1] == 3
@@ -0,0 +1,77 @@
+import io
+import os
+import sqlite3
+
+import pytest
+
+from db import add_habit, connect_database, fetch_habits, update_logs
+from transfer import export_file, import_file, normalize_time
+
+
+@pytest.fixture
+def db():
+    db = connect_database("test_transfer.db")
+    yield db
+    db.close()
+    os.remove("test_transfer.db")
+
+
+@pytest.fixture
+def source():
+    db = connect_database("test_transfer_source.db")
+    add_habit(db, "running", "daily", "health", "2023-12-01 08:00", 2, "2023-12-02 09:00")
+    add_habit(db, "reading", "weekly", "growth", "2023-12-01 08:00", 0)
+    update_logs(db, [("running", False, 0, "2023-12-01 08:00"), ("running", True, 1, "2023-12-01 09:00"),
+                     ("running", True, 2, "2023-12-02 09:00"), ("reading", False, 0, "2023-12-01 08:00")])
+    yield db
+    db.close()
+    os.remove("test_transfer_source.db")
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_round_trip(db, source, fmt):
+    for table in ("habits", "logs"):
+        out = io.StringIO()
+        export_file(source, table, out, fmt)
+        out.seek(0)
+        import_file(db, table, out, fmt, chunk_size=2)
+    query = "SELECT habit, completed, streak, completion_time FROM habit_log ORDER BY habit, completion_time"
+    assert db.execute(query).fetchall() == source.execute(query).fetchall()
+    query = "SELECT * FROM habit_tracker ORDER BY habit"
+    assert db.execute(query).fetchall() == source.execute(query).fetchall()
+
+
+def test_import_legacy_csv(db):
+    habits = io.StringIO("habit,periodicity,category,creation_time,streak,completion_time\n"
+                         "saving,monthly,finance,12/17/2023 20:09,1,12/17/2023 20:13\n")
+    assert import_file(db, "habits", habits, "csv") == 1
+    assert fetch_habits(db) == ["Saving"]
+    logs = io.StringIO('{"habit": "saving", "completed": true, "streak": 3, "completion_time": "12/17/2023 20:13"}\n')
+    import_file(db, "logs", logs, "jsonl")
+    assert db.execute("SELECT completion_time, longest_streak FROM habit_tracker").fetchone() == ("2023-12-17 20:13", 3)
+
+
+def test_import_lower_cases_names(db):
+    habits = io.StringIO("habit,periodicity,category\nRunning,Daily,Health\n")
+    assert import_file(db, "habits", habits, "csv") == 1
+    query = "SELECT habit, periodicity, category FROM habit_tracker"
+    assert db.execute(query).fetchone() == ("running", "daily", "health")
+    assert fetch_habits(db, prefix="ru") == ["Running"]
+    with pytest.raises(ValueError, match="unknown periodicity"):
+        import_file(db, "habits", io.StringIO("habit,periodicity,category\nswimming,yearly,health\n"), "csv")
+
+
+def test_failed_import_rolls_back(db):
+    add_habit(db, "running", "daily", "health", "2023-12-01 08:00", 0)
+    logs = io.StringIO("habit,completed,streak,completion_time\n"
+                       "running,1,1,2023-12-01 09:00\n"
+                       "ghost,1,1,2023-12-01 09:00\n")
+    with pytest.raises(sqlite3.IntegrityError):
+        import_file(db, "logs", logs, "csv", chunk_size=1)
+    assert db.execute("SELECT COUNT(*) FROM habit_log").fetchone()[0] == 0
+
+
+def test_normalize_time():
+    assert normalize_time("12/17/2023 20:09") == "2023-12-17 20:09"
+    assert normalize_time("2023-12-17 20:09") == "2023-12-17 20:09"
+    assert normalize_time("") is None
@@ -0,0 +1,210 @@
+"""
+The transfer module imports and exports habits and logs as CSV or JSON Lines.
+Both directions stream: imports insert fixed-size chunks with executemany inside a single transaction,
+exports write rows straight from the cursor, so memory use does not grow with the size of the data.
+Files hold the habits of one user: exports read those of the connection's user and imports add to them.
+"""
+
+import csv
+import json
+from itertools import islice
+
+import db
+from periods import PERIODICITIES
+
+FORMATS = ("csv", "jsonl")
+
+# Columns exchanged for each table, in file order. Log ids are not exported; they are reassigned on import.
+COLUMNS = {
+    "habits": ("habit", "periodicity", "category", "creation_time", "streak", "completion_time", "longest_streak"),
+    "logs": ("habit", "completed", "streak", "completion_time"),
+}
+
+INSERTS = {
+    "habits": """INSERT INTO habit_tracker (habit, periodicity, category, creation_time, streak, completion_time,
+                                            longest_streak, user) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+    "logs": "INSERT INTO habit_log (habit, completed, streak, completion_time, user) VALUES (?, ?, ?, ?, ?)",
+}
+
+EXPORTS = {
+    "habits": "SELECT {columns} FROM habit_tracker WHERE user = ? {where} ORDER BY habit",
+    "logs": "SELECT {columns} FROM habit_log WHERE user = ? {where} ORDER BY habit, completion_time, id",
+}
+
+TIME_COLUMNS = ("creation_time", "completion_time")
+INT_COLUMNS = ("streak", "longest_streak")
+# Names are stored in lower case, like the habits added through the CLI, the server and the menus.
+NAME_COLUMNS = ("habit", "periodicity", "category")
+
+CHUNK_SIZE = 10000
+
+
+def format_for(path, default="csv"):
+    """
+    Function to pick a format from a file name.
+
+    :param path: File name, or '-' for stdin/stdout.
+    :param default: Format to use when the extension does not tell.
+    :return: 'csv' or 'jsonl'.
+    """
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else ("csv" if path.endswith(".csv") else default)
+
+
+def normalize_time(value):
+    """
+    Function to bring an imported timestamp to db.TIME_FORMAT, converting the legacy "%m/%d/%Y %H:%M" format.
+
+    :param value: Timestamp text; empty values become None.
+    :return: Timestamp in db.TIME_FORMAT, or None.
+    """
+    if not value:
+        return None
+    if value[2:3] == "/" and value[5:6] == "/":
+        return f"{value[6:10]}-{value[0:2]}-{value[3:5]}{value[10:]}"
+    return value
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def read_records(file, fmt):
+    """
+    Generator to read records from a CSV file with a header row or from a JSON Lines file.
+
+    :param file: Open text file.
+    :param fmt: 'csv' or 'jsonl'.
+    :return: Dicts mapping column names to values.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(file)
+    elif fmt == "jsonl":
+        for number, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as exception:
+                    raise ValueError(f"line {number}: {exception}") from None
+    else:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def _row(table, record):
+    if "habit" not in record or not record["habit"]:
+        raise ValueError(f"Record without habit: {record}")
+    row = []
+    for column in COLUMNS[table]:
+        value = record.get(column)
+        if column in NAME_COLUMNS:
+            value = str(value).strip().lower() if value is not None else None
+        elif column in TIME_COLUMNS:
+            value = normalize_time(value)
+        elif column in INT_COLUMNS:
+            value = int(value) if value not in (None, "") else None
+        elif column == "completed":
+            value = _to_bool(value)
+        row.append(value)
+    if table == "habits":
+        if row[1] not in PERIODICITIES:
+            raise ValueError(f"Record with unknown periodicity, expected one of {', '.join(PERIODICITIES)}: {record}")
+        # Missing counters start at zero, and the longest streak is at least the current one.
+        row[4] = row[4] or 0
+        row[6] = max(row[6] or 0, row[4])
+    else:
+        row[2] = row[2] or 0
+    return row
+
+
+def import_records(conn, table, records, chunk_size=CHUNK_SIZE):
+    """
+    Function to insert records into habit_tracker ('habits') or habit_log ('logs').
+    Records are inserted in chunks inside one transaction, so a failing record rolls back the whole import.
+
+    :param conn: To maintain connection with DB.
+    :param table: 'habits' or 'logs'.
+    :param records: Iterable of dicts keyed by the names in COLUMNS[table].
+    :param chunk_size: Number of records per executemany call.
+    :return: Number of imported records.
+    """
+    user = db.user_of(conn)
+    rows = (_row(table, record) + [user] for record in records)
+    count = 0
+    with db.transaction(conn):
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany(INSERTS[table], chunk)
+            count += len(chunk)
+        if table == "habits":
+            db.invalidate_cache(conn)
+        else:
+            # Imported history may hold longer streaks than the ones recorded on habit_tracker.
+            conn.execute("""UPDATE habit_tracker SET longest_streak = MAX(COALESCE(longest_streak, 0), COALESCE(
+                (SELECT MAX(streak) FROM habit_log WHERE habit_log.user = habit_tracker.user
+                                                     AND habit_log.habit = habit_tracker.habit), 0))
+                WHERE user = ?""", (user,))
+    return count
+
+
+def import_file(conn, table, file, fmt, chunk_size=CHUNK_SIZE):
+    """
+    Function to import a CSV or JSON Lines file, see import_records.
+
+    :return: Number of imported records.
+    """
+    return import_records(conn, table, read_records(file, fmt), chunk_size)
+
+
+def export_rows(conn, table, habit=None):
+    """
+    Generator to stream the rows of habit_tracker ('habits') or habit_log ('logs') in a stable order.
+
+    :param conn: To maintain connection with DB.
+    :param table: 'habits' or 'logs'.
+    :param habit: Only export this habit, or its log.
+    :return: Tuples of the values in COLUMNS[table].
+    """
+    where, params = ("AND habit = ?", (habit,)) if habit is not None else ("", ())
+    query = EXPORTS[table].format(columns=", ".join(COLUMNS[table]), where=where)
+    cur = conn.cursor()
+    cur.arraysize = 1000
+    cur.execute(query, (db.user_of(conn),) + params)
+    while True:
+        rows = cur.fetchmany()
+        if not rows:
+            return
+        yield from rows
+
+
+def export_file(conn, table, file, fmt, habit=None):
+    """
+    Function to write a table to a CSV file with a header row or to a JSON Lines file.
+
+    :param conn: To maintain connection with DB.
+    :param table: 'habits' or 'logs'.
+    :param file: Open text file to write to.
+    :param fmt: 'csv' or 'jsonl'.
+    :param habit: Only export this habit, or its log.
+    :return: Number of exported rows.
+    """
+    columns = COLUMNS[table]
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for row in export_rows(conn, table, habit):
+            writer.writerow(row)
+            count += 1
+    elif fmt == "jsonl":
+        for row in export_rows(conn, table, habit):
+            record = dict(zip(columns, row))
+            if "completed" in record:
+                record["completed"] = bool(record["completed"])
+            file.write(json.dumps(record) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}")
+    return count